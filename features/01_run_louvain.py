@@ -1,16 +1,26 @@
 import pandas as pd
+import numpy as np
 import networkx as nx
-from networkx.algorithms.community import louvain_communities, modularity
-import pickle
+import igraph as ig
+import joblib
+import random
 import time
 import os
+import sys
+
+# Shared artifact I/O and graph helpers live next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prot_clust_modules"))
+from cluster_artifact import save_cluster_artifact, save_annotated_graph
+from graph_metrics import cluster_members, relabel_by_size
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
 INPUT_CSV_PATH = "data/cleaned_data.csv"
 OUTPUT_DIR = "data/output"
-OUTPUT_PICKLE_NAME = "louvain_clust_julle.pkl"
+OUTPUT_PICKLE_NAME = "louvain_clust_julle.pkl"  # Full objects, used by the notebook modules
+OUTPUT_NPZ_NAME = "louvain_clust_julle.npz"     # Compact CSR + labels, used by scripts 02-04
+OUTPUT_GRAPH_PREFIX = "louvain_annotated_graph"  # .npz edges + .parquet node table, used by the plotting scripts
 LOUVAIN_RESOLUTION = 1.0
 RANDOM_SEED = 42
 
@@ -20,52 +30,104 @@ def main():
     
     print(f"[INFO] Loading data from {INPUT_CSV_PATH}...")
     try:
-        # Load interaction data
-        df_interactions = pd.read_csv(INPUT_CSV_PATH)
+        # Load interaction data (multi-threaded Arrow parser, typed columns)
+        df_interactions = pd.read_csv(
+            INPUT_CSV_PATH,
+            engine='pyarrow',
+            usecols=['protein1', 'protein2', 'combined_score'],
+            dtype={'protein1': 'string[pyarrow]', 'protein2': 'string[pyarrow]', 'combined_score': 'int16'}
+        )
     except FileNotFoundError:
         print(f"[ERROR] Input file not found at {INPUT_CSV_PATH}")
         return
 
     # Build Weighted Graph
-    print("[INFO] Building NetworkX graph...")
-    G = nx.Graph()
-    # Iterate efficiently using zip for speed over pandas rows
-    for p1, p2, score in zip(df_interactions['protein1'], 
-                             df_interactions['protein2'], 
-                             df_interactions['combined_score']):
-        G.add_edge(p1, p2, weight=score)
+    print("[INFO] Building graph (igraph for Louvain, NetworkX copy for the pickle)...")
+    # Build in one vectorized call instead of a per-row add_edge loop
+    df_interactions = df_interactions.rename(columns={'combined_score': 'weight'})
+    G = nx.from_pandas_edgelist(df_interactions, 'protein1', 'protein2', edge_attr='weight')
 
     print(f"[STATS] Nodes: {G.number_of_nodes()}, Edges: {G.number_of_edges()}")
 
-    # Run Louvain Clustering
+    # Intern protein names once: id2name[i] is the name of node i and every edge
+    # becomes a pair of int32 IDs, so the clustering never hashes a string
+    codes, id2name = pd.factorize(pd.concat([df_interactions['protein1'], df_interactions['protein2']], ignore_index=True))
+    codes = codes.astype(np.int32).reshape(2, -1).T
+    id2name = np.asarray(id2name, dtype=str)
+
+    # igraph copy of the same edges (integer vertex IDs) for the C-backed Louvain implementation
+    g_ig = ig.Graph(
+        n=len(id2name),
+        edges=codes,
+        edge_attrs={'weight': df_interactions['weight'].to_numpy()}
+    )
+    # Mirror from_pandas_edgelist: one edge per protein pair, last row wins
+    g_ig.simplify(loops=False, combine_edges='last')
+
+    # Run Louvain Clustering (igraph's multilevel algorithm, same modularity heuristic)
     print(f"[INFO] Running Louvain clustering (Resolution={LOUVAIN_RESOLUTION})...")
+    random.seed(RANDOM_SEED)  # igraph draws its random numbers from Python's 'random' module
     t0 = time.time()
-    communities = louvain_communities(G, weight='weight', resolution=LOUVAIN_RESOLUTION, seed=RANDOM_SEED)
+    partition = g_ig.community_multilevel(weights='weight', resolution=LOUVAIN_RESOLUTION)
     t1 = time.time()
+
+    # Cluster ID per node ID; names are only looked up for the pickled dict/set views.
+    # Clusters are renumbered largest first (as the MCL scripts store them), so the
+    # overview tables can use the stored order directly
+    labels = relabel_by_size(np.asarray(partition.membership, dtype=np.int32), len(partition))
+    # Member names per cluster from one argsort of the labels (no per-member loop)
+    communities = cluster_members(id2name, labels, len(partition))
+
+    # Node -> cluster lookup, computed once here so downstream scripts don't rebuild it
+    node2cluster = dict(zip(id2name.tolist(), labels.tolist()))
     
     # Calculate Modularity
-    mod_score = modularity(G, communities, weight='weight')
+    mod_score = g_ig.modularity(partition.membership, weights='weight')
     
     print(f"[RESULT] Detected {len(communities)} communities in {t1 - t0:.2f}s")
     print(f"[RESULT] Global Modularity: {mod_score:.4f}")
 
+    parameters = {
+        "resolution": LOUVAIN_RESOLUTION,
+        "seed": RANDOM_SEED
+    }
+
+    # Save the compact artifact: CSR adjacency over node IDs + id2name + labels
+    adjacency = g_ig.get_adjacency_sparse(attribute='weight')
+    npz_path = os.path.join(OUTPUT_DIR, OUTPUT_NPZ_NAME)
+    print(f"[INFO] Saving compact results to {npz_path}...")
+    save_cluster_artifact(
+        npz_path,
+        adjacency,
+        id2name,
+        labels,
+        modularity=mod_score,
+        params=parameters
+    )
+
+    # Annotated graph for the plotting scripts (CSR edges + protein/cluster_id table)
+    graph_prefix = os.path.join(OUTPUT_DIR, OUTPUT_GRAPH_PREFIX)
+    print(f"[INFO] Saving annotated graph to {graph_prefix}.npz/.parquet...")
+    save_annotated_graph(graph_prefix, adjacency, id2name, labels)
+
     # Prepare data for pickling
-    # We save both the graph object and the communities list
+    # We save the graph object, the communities list and the node lookup,
+    # plus the CSR adjacency / node names / labels the bottleneck module slices
     data_to_save = {
         "graph": G,
         "communities": communities,
+        "node2cluster": node2cluster,
+        "csr": adjacency,
+        "nodes": id2name,
+        "labels": labels,
         "modularity": mod_score,
-        "parameters": {
-            "resolution": LOUVAIN_RESOLUTION,
-            "seed": RANDOM_SEED
-        }
+        "parameters": parameters
     }
 
-    # Save to Pickle
+    # Save to Pickle (joblib writes NumPy buffers raw, so readers can memory-map them)
     output_path = os.path.join(OUTPUT_DIR, OUTPUT_PICKLE_NAME)
     print(f"[INFO] Saving results to {output_path}...")
-    with open(output_path, "wb") as f:
-        pickle.dump(data_to_save, f)
+    joblib.dump(data_to_save, output_path)
     
     print("[DONE] Script 1 completed successfully.")
 
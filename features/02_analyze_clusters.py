@@ -1,16 +1,20 @@
 import pandas as pd
-import networkx as nx
-import pickle
 import os
-import collections
+import sys
 import numpy as np
 
+# Shared vectorized metrics and artifact I/O live next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prot_clust_modules"))
+from graph_metrics import cluster_stats_csr
+from cluster_artifact import load_cluster_artifact
+
 # ==========================================
 # CONFIGURATION
 # ==========================================
-INPUT_PICKLE_PATH = "data/output/louvain_clust_julle.pkl"
+INPUT_NPZ_PATH = "data/output/louvain_clust_julle.npz"
 OUTPUT_DIR = "data/output"
-OUTPUT_STATS_CSV = "cluster_statistics.csv"
+OUTPUT_STATS_PARQUET = "cluster_statistics.parquet"  # Full table
+OUTPUT_STATS_CSV = "cluster_statistics.csv"  # Human-readable companion (displayed rows only)
 
 # How many top clusters to display in the notebook output? (Set to None for all)
 DISPLAY_TOP_N_ROWS = 20 
@@ -19,37 +23,37 @@ def main():
     # ---------------------------------------------------------
     # 1. Setup and Loading
     # ---------------------------------------------------------
-    print(f"[INFO] Loading pickle from {INPUT_PICKLE_PATH}...")
+    print(f"[INFO] Loading clustering from {INPUT_NPZ_PATH}...")
     
-    if not os.path.exists(INPUT_PICKLE_PATH):
-        print(f"[ERROR] Pickle file not found at {INPUT_PICKLE_PATH}")
+    if not os.path.exists(INPUT_NPZ_PATH):
+        print(f"[ERROR] Clustering file not found at {INPUT_NPZ_PATH}")
         print("[HINT] Please run Script 1 (01_run_louvain.py) first.")
         return
 
-    with open(INPUT_PICKLE_PATH, "rb") as f:
-        data = pickle.load(f)
+    data = load_cluster_artifact(INPUT_NPZ_PATH)
 
-    G = data['graph']
-    communities = data['communities']
+    # CSR adjacency, node names and cluster ID per row (precomputed by Script 1)
+    A = data['adjacency']
+    nodes = data['nodes']
+    labels = data['labels']
+    if labels.size == 0 or labels.max() < 0:
+        print(f"[ERROR] No clustered nodes in {INPUT_NPZ_PATH}")
+        return
+    n_clusters = int(labels.max()) + 1
 
     # ---------------------------------------------------------
     # 2. Process Communities
     # ---------------------------------------------------------
     print("[INFO] Processing community data...")
-    
-    # Create Node-to-Cluster Dictionary
-    node2cluster_id = {}
-    for cluster_id, comm in enumerate(communities):
-        for n in comm:
-            node2cluster_id[n] = cluster_id
-
-    # Calculate Global Stats
-    sizes = collections.Counter(node2cluster_id.values())
-    median_size = np.median(list(sizes.values()))
+
+    # Calculate Global Stats (size, edges, density and weighted clustering of every
+    # cluster in one pass; each cluster's max weight is found once, up front)
+    sizes, edges, density, avg_clust = cluster_stats_csr(A, labels, n_clusters)
+    median_size = np.median(sizes)
     
     print("-" * 40)
-    print(f"[STATS] Total Nodes Clustered: {len(node2cluster_id)}")
-    print(f"[STATS] Total Communities Detected: {len(communities)}")
+    print(f"[STATS] Total Nodes Clustered: {len(nodes)}")
+    print(f"[STATS] Total Communities Detected: {n_clusters}")
     print(f"[STATS] Median cluster size: {median_size:.1f}")
     print("-" * 40)
 
@@ -57,42 +61,35 @@ def main():
     # 3. Detailed Cluster Analysis
     # ---------------------------------------------------------
     print("[INFO] Calculating detailed statistics per cluster (Density, Clustering Coeff)...")
-    
-    rows = []
-    for cluster_id, comm in enumerate(communities):
-        # Create a subgraph for the specific community to calculate internal metrics
-        H = G.subgraph(comm)
-        
-        # Calculate Average Clustering 
-        # (Handle single nodes where clustering is undefined/0)
-        avg_clust = 0.0
-        if H.number_of_nodes() > 1:
-            try:
-                avg_clust = nx.average_clustering(H, weight="weight")
-            except:
-                avg_clust = 0.0
-
-        rows.append({
-            "Cluster ID": cluster_id,
-            "Size (Nodes)": H.number_of_nodes(),
-            "Edges": H.number_of_edges(),
-            "Density": nx.density(H),
-            "Avg Clustering": avg_clust
-        })
 
     # Create DataFrame
-    df_clusters = pd.DataFrame(rows)
+    df_clusters = pd.DataFrame({
+        "Cluster ID": np.arange(n_clusters),
+        "Size (Nodes)": sizes,
+        "Edges": edges,
+        "Density": density,
+        "Avg Clustering": avg_clust
+    })
     
-    # Sort by Size (Largest to Smallest)
-    df_clusters = df_clusters.sort_values(by="Size (Nodes)", ascending=False).reset_index(drop=True)
+    # Sort by Size (Largest to Smallest); clusterings are stored in that order
+    # already, so only older files need it
+    if np.any(sizes[1:] > sizes[:-1]):
+        df_clusters = df_clusters.sort_values(by="Size (Nodes)", ascending=False, kind="stable").reset_index(drop=True)
+
+    # Rows shown below and exported to the CSV companion
+    df_top = df_clusters.head(DISPLAY_TOP_N_ROWS) if DISPLAY_TOP_N_ROWS else df_clusters
 
     # ---------------------------------------------------------
-    # 4. Save to CSV
+    # 4. Save to Parquet (+ small CSV)
     # ---------------------------------------------------------
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    output_parquet_path = os.path.join(OUTPUT_DIR, OUTPUT_STATS_PARQUET)
+    df_clusters.to_parquet(output_parquet_path, engine="pyarrow", compression="zstd", index=False)
+    print(f"[INFO] Full cluster statistics saved to: {output_parquet_path}")
+
     output_csv_path = os.path.join(OUTPUT_DIR, OUTPUT_STATS_CSV)
-    df_clusters.to_csv(output_csv_path, index=False)
-    print(f"[INFO] Full cluster statistics saved to: {output_csv_path}")
+    df_top.to_csv(output_csv_path, index=False)
+    print(f"[INFO] Top {len(df_top)} clusters saved to: {output_csv_path}")
 
     # ---------------------------------------------------------
     # 5. Display Table for Jupyter Notebook
@@ -100,19 +97,10 @@ def main():
     print("\n" + "="*60)
     print(f"CLUSTER STATISTICS TABLE (Top {DISPLAY_TOP_N_ROWS if DISPLAY_TOP_N_ROWS else 'All'})")
     print("="*60)
-    
-    # Adjust pandas display settings for this printout to make it pretty
-    pd.set_option('display.max_rows', DISPLAY_TOP_N_ROWS)
-    pd.set_option('display.max_columns', None)
-    pd.set_option('display.width', 1000)
-    pd.set_option('display.float_format', '{:.4f}'.format)
-    
-    # Print the dataframe as a string (looks like a table)
-    if DISPLAY_TOP_N_ROWS:
-        print(df_clusters.head(DISPLAY_TOP_N_ROWS).to_string(index=False))
-    else:
-        print(df_clusters.to_string(index=False))
-        
+
+    # Print the dataframe as a string (looks like a table), rounded to 4 decimals
+    print(df_top.round(4).to_string(index=False))
+
     print("="*60 + "\n")
     print("[DONE] Analysis complete.")
 
@@ -1,62 +1,118 @@
-import networkx as nx
 import numpy as np
-import matplotlib.pyplot as plt
-from networkx.algorithms.community import louvain_communities
-from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
+import igraph as ig
+import scipy.sparse
+from joblib import Parallel, delayed
 import itertools
-import pickle
+import random
 import os
+import sys
+
+# Shared graph helpers and artifact I/O live next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prot_clust_modules"))
+from graph_metrics import csr_to_igraph
+from cluster_artifact import load_cluster_artifact
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
-INPUT_PICKLE_PATH = "data/output/louvain_clust_julle.pkl"
+INPUT_NPZ_PATH = "data/output/louvain_clust_julle.npz"
 OUTPUT_DIR = "data/output/images"
 SEEDS = [1, 50, 100, 200, 500, 1000, 3000, 5000, 7000, 10000]
 RESOLUTION = 1.0
+N_JOBS = min(len(SEEDS), os.cpu_count() or 1)  # Seeds are independent, run them side by side
+
+def run_louvain(g_ig, seed):
+    """
+    Runs igraph's multilevel (Louvain) clustering for one seed and returns
+    the cluster label of every vertex as an int32 array. Vertices are integer
+    IDs in node order, so the labels need no name -> label conversion.
+    """
+    # Dedicated RNG per run instead of reseeding the global 'random' module
+    ig.set_random_number_generator(random.Random(seed))
+    partition = g_ig.community_multilevel(weights='weight', resolution=RESOLUTION)
+    return np.asarray(partition.membership, dtype=np.int32)
 
-def communities_to_labels(communities, nodes):
+def run_louvain_batch(g_ig, seeds):
     """
-    Convert a list of sets (communities) into a list of labels 
-    matching the order of the nodes list for sklearn metrics.
+    Runs run_louvain for several seeds on the same igraph object, so a worker
+    receives the graph once for its whole share of the seeds.
     """
-    node2label = {}
-    for label, comm in enumerate(communities):
-        for n in comm:
-            node2label[n] = label
-    return [node2label[n] for n in nodes]
+    return [run_louvain(g_ig, seed) for seed in seeds]
+
+def _comb2(x):
+    """Number of unordered pairs, n choose 2 (works elementwise on arrays)."""
+    return x * (x - 1) / 2.0
+
+def _entropy(counts):
+    """Shannon entropy (natural log) of a label distribution given its counts."""
+    p = counts / counts.sum()
+    return -np.sum(p * np.log(p))
+
+def pairwise_scores(labels_a, labels_b, counts_a, counts_b, entropy_a, entropy_b):
+    """
+    Computes ARI and NMI for two label vectors from a single sparse contingency table.
+    Same definitions as sklearn's adjusted_rand_score and normalized_mutual_info_score
+    (arithmetic normalization), but the per-run counts and entropies are precomputed
+    once by the caller instead of being rebuilt for every pair.
+    """
+    n = labels_a.size
+    C = scipy.sparse.coo_matrix(
+        (np.ones(n), (labels_a, labels_b)), shape=(counts_a.size, counts_b.size)
+    ).tocsr().tocoo()  # CSR round-trip sums duplicate (a, b) entries
+    nij = C.data
+
+    # Adjusted Rand Index
+    sum_comb = _comb2(nij).sum()
+    sum_a = _comb2(counts_a).sum()
+    sum_b = _comb2(counts_b).sum()
+    expected = sum_a * sum_b / _comb2(n)
+    max_index = (sum_a + sum_b) / 2.0
+    ari = 1.0 if max_index == expected else (sum_comb - expected) / (max_index - expected)
+
+    # Normalized Mutual Information
+    if counts_a.size == counts_b.size == 1:
+        return ari, 1.0
+    mi = np.sum(nij / n * (np.log(nij * n) - np.log(counts_a[C.row] * counts_b[C.col])))
+    normalizer = max((entropy_a + entropy_b) / 2.0, np.finfo(float).eps)
+    nmi = max(mi, 0.0) / normalizer
+
+    return ari, nmi
 
 def main():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-    # Load Graph
-    print(f"[INFO] Loading graph from {INPUT_PICKLE_PATH}...")
-    with open(INPUT_PICKLE_PATH, "rb") as f:
-        data = pickle.load(f)
-    G = data['graph']
-    
-    nodes_list = list(G.nodes())
-    all_community_sets = []
+    # Load Graph (CSR adjacency + node names from Script 1)
+    print(f"[INFO] Loading graph from {INPUT_NPZ_PATH}...")
+    data = load_cluster_artifact(INPUT_NPZ_PATH)
+    g_ig = csr_to_igraph(data['adjacency'], data['nodes'])
+
+    print(f"[INFO] Running Louvain {len(SEEDS)} times to test reproducibility ({N_JOBS} parallel jobs)...")
 
-    print(f"[INFO] Running Louvain {len(SEEDS)} times to test reproducibility...")
+    # Run clustering multiple times: the graph is built once above and every
+    # worker process gets it once, together with its share of the seeds
+    seed_batches = [batch.tolist() for batch in np.array_split(SEEDS, N_JOBS)]
+    batches = Parallel(n_jobs=N_JOBS, backend='loky')(
+        delayed(run_louvain_batch)(g_ig, batch)
+        for batch in seed_batches
+    )
+    label_vectors = [labels for batch in batches for labels in batch]
 
-    # Run clustering multiple times
-    for s in SEEDS:
-        print(f"   > Running seed {s}...")
-        comms = louvain_communities(G, weight='weight', resolution=RESOLUTION, seed=s)
-        all_community_sets.append(comms)
+    # Stack the label vectors for comparison (one int32 row per run)
+    L = np.vstack(label_vectors)
 
-    # Convert to label vectors for comparison
-    label_vectors = [communities_to_labels(comms, nodes_list) for comms in all_community_sets]
+    # Per-run cluster sizes and entropies are shared by every pair the run appears in
+    counts = [np.bincount(row).astype(float) for row in L]
+    entropies = [_entropy(c) for c in counts]
 
     # Compute pairwise ARI and NMI
     ari_scores = []
     nmi_scores = []
 
     print("[INFO] Computing pairwise ARI and NMI scores...")
-    for vec1, vec2 in itertools.combinations(label_vectors, 2):
-        ari_scores.append(adjusted_rand_score(vec1, vec2))
-        nmi_scores.append(normalized_mutual_info_score(vec1, vec2))
+    for i, j in itertools.combinations(range(len(L)), 2):
+        ari, nmi = pairwise_scores(L[i], L[j], counts[i], counts[j], entropies[i], entropies[j])
+        ari_scores.append(ari)
+        nmi_scores.append(nmi)
 
     mean_ari = np.mean(ari_scores)
     mean_nmi = np.mean(nmi_scores)
@@ -69,11 +125,16 @@ def main():
 
     # Visualization: Cluster Size Distributions
     print("[INFO] Generating reproducibility plot...")
+    # Imported here so the clustering runs don't pay matplotlib's start-up cost;
+    # Agg skips GUI backend initialization (the plot is only saved to disk)
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(10, 6))
-    for i, comms in enumerate(all_community_sets):
-        sizes = [len(c) for c in comms]
+    for i, sizes in enumerate(counts):
         # Sort sizes descending for 'Zipf' style plot
-        plt.plot(sorted(sizes, reverse=True), label=f"seed={SEEDS[i]}", alpha=0.7)
+        plt.plot(np.sort(sizes)[::-1], label=f"seed={SEEDS[i]}", alpha=0.7)
     
     plt.xlabel("Cluster Rank")
     plt.ylabel("Cluster Size")
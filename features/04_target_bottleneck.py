@@ -1,14 +1,23 @@
 import networkx as nx
-import pickle
+import numpy as np
+import pandas as pd
 import os
-import matplotlib.pyplot as plt
+import sys
+
+# Shared graph helpers and artifact I/O live next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prot_clust_modules"))
+from graph_metrics import igraph_betweenness, block_to_nx, degree_strength, clustering_csr
+from cluster_artifact import load_cluster_artifact
+from layout_cache import cached_layout
 
 # ==========================================
 # CONFIGURATION
 # ==========================================
-INPUT_PICKLE_PATH = "data/output/louvain_clust_julle.pkl"
+INPUT_NPZ_PATH = "data/output/louvain_clust_julle.npz"
 OUTPUT_DIR = "data/output"
 IMAGE_DIR = "data/output/images"
+LAYOUT_CACHE_DIR = "data/output/layouts"  # Cached cluster layouts, reused across target queries
+LAYOUT_METHOD = "spring"  # "spring", "kamada_kawai" or "spectral"
 TARGET_PROTEIN = "SNCAIP"  # Change this to query different proteins
 TOP_N_RANKING = 40
 
@@ -18,101 +27,92 @@ def main():
 
     # 1. Load Data
     print(f"[INFO] Loading data...")
-    if not os.path.exists(INPUT_PICKLE_PATH):
-        print("Pickle not found.")
+    if not os.path.exists(INPUT_NPZ_PATH):
+        print("Clustering file not found.")
         return
 
-    with open(INPUT_PICKLE_PATH, "rb") as f:
-        data = pickle.load(f)
+    data = load_cluster_artifact(INPUT_NPZ_PATH)
     
-    G = data['graph']
-    communities = data['communities']
-
-    # 2. Map nodes to clusters
-    node2cluster_id = {}
-    for cluster_id, comm in enumerate(communities):
-        for n in comm:
-            node2cluster_id[n] = cluster_id
+    # 2. CSR adjacency, node names and cluster ID per row (precomputed by Script 1)
+    A = data['adjacency']
+    nodes = data['nodes']
+    labels = data['labels']
 
     # 3. Locate Target
-    if TARGET_PROTEIN not in node2cluster_id:
+    target_idx = np.flatnonzero(nodes == TARGET_PROTEIN)
+    if target_idx.size == 0:
         print(f"[ERROR] Target protein '{TARGET_PROTEIN}' not found in the network.")
         return
 
-    target_cluster_id = node2cluster_id[TARGET_PROTEIN]
+    target_cluster_id = int(labels[target_idx[0]])
     print(f"[INFO] Target '{TARGET_PROTEIN}' found in Cluster ID: {target_cluster_id}")
 
-    # Extract nodes for target cluster and background
-    target_nodes = {n for n, c in node2cluster_id.items() if c == target_cluster_id}
+    # Extract rows/names for target cluster
+    cluster_idx = np.flatnonzero(labels == target_cluster_id)
+    target_nodes = nodes[cluster_idx].tolist()
     
     # Save Target Cluster Nodes
     with open(os.path.join(OUTPUT_DIR, "target_cluster_nodes.txt"), "w") as f:
-        f.write(repr(list(target_nodes)))
+        f.write(repr(target_nodes))
     
     print(f"[INFO] Extracted target cluster with {len(target_nodes)} nodes.")
 
     # 4. Bottleneck Analysis on Subgraph
     print("[INFO] Performing bottleneck analysis on target subgraph...")
-    target_subgraph = G.subgraph(target_nodes).copy()
+    # Slice the cluster's adjacency block once; the nx graph and degrees both come from it
+    A_sub = A[cluster_idx][:, cluster_idx]
+    target_subgraph = block_to_nx(A_sub, target_nodes)
 
-    # A. Betweenness Centrality
-    bc_scores = nx.betweenness_centrality(target_subgraph, weight="weight", normalized=True)
+    # A. Betweenness Centrality (igraph's C Dijkstra/Brandes, normalized like NetworkX)
+    bc_scores = igraph_betweenness(target_subgraph, weight="weight")
     
-    # B. Degree Centrality (Node Degree)
-    deg_scores = dict(target_subgraph.degree())
+    # B. Degree Centrality (Node Degree), read off the cluster's CSR rows
+    deg, _ = degree_strength(A_sub)
+    deg_scores = dict(zip(target_nodes, deg.tolist()))
     
-    # C. Clustering Coefficient
-    clust_scores = nx.clustering(target_subgraph, weight="weight")
+    # C. Clustering Coefficient (weighted, from the cluster's CSR block)
+    clust_scores = dict(zip(target_nodes, clustering_csr(A_sub).tolist()))
 
     # 5. Combined Ranking Calculation
     # We rank proteins based on: High BC + High Degree + Low Clustering Coefficient
     
-    # Sort and create rank lookup dictionaries
-    sorted_bc = sorted(bc_scores.items(), key=lambda x: x[1], reverse=True)[:TOP_N_RANKING]
-    bc_ranks = {p: i+1 for i, (p, _) in enumerate(sorted_bc)}
-
-    sorted_deg = sorted(deg_scores.items(), key=lambda x: x[1], reverse=True)[:TOP_N_RANKING]
-    deg_ranks = {p: i+1 for i, (p, _) in enumerate(sorted_deg)}
+    # One row per protein, one column per metric
+    df_rank = pd.DataFrame({"BC": bc_scores, "Deg": deg_scores, "Clust": clust_scores})
 
-    # Ascending sort for clustering (we want LOW clustering)
-    sorted_clust = sorted(clust_scores.items(), key=lambda x: x[1], reverse=False)[:TOP_N_RANKING]
-    clust_ranks = {p: i+1 for i, (p, _) in enumerate(sorted_clust)}
-
-    # Calculate combined rank
+    # Ordinal ranks (ties keep node order); ascending for clustering (we want LOW clustering)
     # Note: If a protein is not in the Top N for a specific metric, we apply a penalty rank (TOP_N + 1)
-    unique_proteins = set(bc_ranks.keys()) | set(deg_ranks.keys()) | set(clust_ranks.keys())
-    
-    combined_results = []
-    for p in unique_proteins:
-        r_bc = bc_ranks.get(p, TOP_N_RANKING + 1)
-        r_deg = deg_ranks.get(p, TOP_N_RANKING + 1)
-        r_clust = clust_ranks.get(p, TOP_N_RANKING + 1)
-        
-        total_rank_score = r_bc + r_deg + r_clust
-        combined_results.append({
-            "Protein": p,
-            "BC_Rank": r_bc,
-            "Deg_Rank": r_deg,
-            "Clust_Rank": r_clust,
-            "Total_Score": total_rank_score
-        })
+    penalty = TOP_N_RANKING + 1
+    rank_cols = {"BC_Rank": ("BC", False), "Deg_Rank": ("Deg", False), "Clust_Rank": ("Clust", True)}
+    for rank_col, (metric, ascending) in rank_cols.items():
+        ranks = df_rank[metric].rank(method="first", ascending=ascending).astype(int)
+        df_rank[rank_col] = ranks.where(ranks <= TOP_N_RANKING, penalty)
+
+    # Only proteins in the Top N of at least one metric are candidates
+    df_rank = df_rank[(df_rank[list(rank_cols)] < penalty).any(axis=1)]
+    df_rank["Total_Score"] = df_rank[list(rank_cols)].sum(axis=1)
 
     # Sort by total score (lower is better)
-    combined_results.sort(key=lambda x: x["Total_Score"])
+    top_results = df_rank.nsmallest(10, "Total_Score")
 
     # 6. Output Ranking Results
     print(f"\n[RESULTS] Top 10 Bottleneck Candidates in Cluster {target_cluster_id}:")
     print(f"{'Rank':<5} {'Protein':<15} {'Total':<8} {'BC':<5} {'Deg':<5} {'Clust':<5}")
     print("-" * 50)
     
-    for i, res in enumerate(combined_results[:10], 1):
-        print(f"{i:<5} {res['Protein']:<15} {res['Total_Score']:<8} {res['BC_Rank']:<5} {res['Deg_Rank']:<5} {res['Clust_Rank']:<5}")
+    for i, res in enumerate(top_results.itertuples(), 1):
+        print(f"{i:<5} {res.Index:<15} {res.Total_Score:<8} {res.BC_Rank:<5} {res.Deg_Rank:<5} {res.Clust_Rank:<5}")
 
     # 7. Visualization of Top Candidates in Subgraph
-    top_candidates = [res['Protein'] for res in combined_results[:10]]
-    
+    top_candidates = top_results.index.tolist()
+
+    # Plotting-only import, deferred until the analysis is done (non-interactive backend)
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(10, 8))
-    pos = nx.spring_layout(target_subgraph, seed=42)
+    # Layout is cached per cluster graph, so querying another protein of the same cluster skips it
+    pos = cached_layout(target_subgraph, LAYOUT_CACHE_DIR, prefix=f"cluster_{target_cluster_id}", method=LAYOUT_METHOD, seed=42)
     
     # Draw all nodes
     nx.draw_networkx_nodes(target_subgraph, pos, node_size=30, node_color='lightgrey', alpha=0.6)
@@ -127,9 +127,9 @@ def main():
     nx.draw_networkx_nodes(target_subgraph, pos, nodelist=top_candidates, node_color='blue', node_size=100, label="Bottlenecks")
     
     # Labels for top candidates only to avoid clutter
-    labels = {n: n for n in top_candidates}
-    labels[TARGET_PROTEIN] = TARGET_PROTEIN
-    nx.draw_networkx_labels(target_subgraph, pos, labels=labels, font_size=8, font_weight="bold")
+    node_labels = {n: n for n in top_candidates}
+    node_labels[TARGET_PROTEIN] = TARGET_PROTEIN
+    nx.draw_networkx_labels(target_subgraph, pos, labels=node_labels, font_size=8, font_weight="bold")
 
     plt.title(f"Target Cluster: {target_cluster_id} (Query: {TARGET_PROTEIN})")
     plt.legend()
@@ -1,26 +1,32 @@
-import networkx as nx
-import pickle
+import numpy as np
+import os
+import sys
 
-# 1. Load the pre-calculated graph
+# Graph loader lives next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "prot_clust_modules"))
+from cluster_artifact import load_graph
+
+# 1. Load the pre-calculated graph (CSR edges + protein/cluster_id table)
 print("Loading graph...")
-with open("data/output/louvain_annotated_graph.pkl", "rb") as f:
-    G = pickle.load(f)
+A, nodes_df = load_graph("data/output/louvain_annotated_graph")
+names = nodes_df["protein"].to_numpy()
+labels = nodes_df["cluster_id"].to_numpy()
 
 # 2. Access Cluster Information
-# Access the attribute 'cluster_id' we saved earlier
+# Row i of the node table is row i of the adjacency
 node_name = "CHMP2B" # Example protein
-if node_name in G:
-    cluster = G.nodes[node_name]['cluster_id']
+node_idx = np.flatnonzero(names == node_name)
+if node_idx.size:
+    cluster = labels[node_idx[0]]
     print(f"{node_name} is in cluster {cluster}")
 
 # 3. Access Connectivity (Edges)
-# Edges are preserved
-neighbors = list(G.neighbors(node_name))
+# Neighbors are the column indices of the node's CSR row
+neighbors = names[A[node_idx[0]].indices].tolist()
 print(f"{node_name} interacts with: {neighbors}")
 
 # 4. Filter specific clusters
 target_cluster_id = 0
-nodes_in_cluster_0 = [n for n, attrs in G.nodes(data=True) 
-                      if attrs['cluster_id'] == target_cluster_id]
+nodes_in_cluster_0 = names[labels == target_cluster_id].tolist()
 
 print(f"Cluster 0 has {len(nodes_in_cluster_0)} nodes.")
\ No newline at end of file
@@ -1,15 +1,19 @@
-import networkx as nx
 from pyvis.network import Network
-import pickle
+import numpy as np
+import scipy.sparse
 import os
 import sys
 
+# Graph loader lives next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prot_clust_modules"))
+from cluster_artifact import load_graph
+
 # ==========================================
 #        USER CONFIGURATION
 # ==========================================
 
 # File Paths
-INPUT_PICKLE_PATH = "data/output/louvain_annotated_graph.pkl"
+INPUT_GRAPH_PREFIX = "data/output/louvain_annotated_graph"  # .npz (CSR edges) + .parquet (protein, cluster_id)
 OUTPUT_DIR = "data/output/plots"
 
 # Visual Settings
@@ -28,34 +32,35 @@ def create_interactive_plot(protein_name):
     print(f"--- Generating Interactive Graph for: {protein_name} ---")
 
     # 1. Load Data
-    if not os.path.exists(INPUT_PICKLE_PATH):
-        print("Error: Pickle file not found. Run 'run_louvain_graph.py' first.")
+    if not os.path.exists(INPUT_GRAPH_PREFIX + ".npz"):
+        print("Error: Graph file not found. Run '01_run_louvain.py' first.")
         return
 
     try:
-        with open(INPUT_PICKLE_PATH, "rb") as f:
-            G_full = pickle.load(f)
+        A, nodes_df = load_graph(INPUT_GRAPH_PREFIX)
     except Exception as e:
         print(f"Error loading graph: {e}")
         return
 
+    names = nodes_df["protein"].to_numpy()
+    labels = nodes_df["cluster_id"].to_numpy()
+
     # 2. Validate Protein
-    if protein_name not in G_full.nodes:
+    target_idx = np.flatnonzero(names == protein_name)
+    if target_idx.size == 0:
         print(f"Error: Protein '{protein_name}' not found in dataset.")
         return
 
     # 3. Extract Cluster
-    target_cluster_id = G_full.nodes[protein_name].get('cluster_id')
-    if target_cluster_id is None:
-        print("Error: No cluster ID found on node.")
-        return
+    target_cluster_id = int(labels[target_idx[0]])
 
     print(f"Extracting Cluster {target_cluster_id}...")
-    cluster_nodes = [n for n, attrs in G_full.nodes(data=True) 
-                     if attrs.get('cluster_id') == target_cluster_id]
+    cluster_idx = np.flatnonzero(labels == target_cluster_id)
+    cluster_nodes = names[cluster_idx].tolist()
     
-    # Create NetworkX Subgraph
-    nx_subgraph = G_full.subgraph(cluster_nodes)
+    # Edges of the cluster: upper triangle of its CSR block (each pair once)
+    block = scipy.sparse.triu(A[cluster_idx][:, cluster_idx]).tocoo()
+    cluster_edges = zip(block.row.tolist(), block.col.tolist(), block.data.tolist())
 
     # 4. Initialize PyVis Network
     # height/width: 100% fills the browser window
@@ -63,53 +68,57 @@ def create_interactive_plot(protein_name):
     # font_color: Label color
     net = Network(height="90vh", width="100%", bgcolor="#ffffff", font_color="black")
     
-    # 5. Translate NetworkX data to PyVis with Custom Styling
+    # 5. Translate the cluster to PyVis records with Custom Styling
+    # (built in one pass and assigned as a whole)
     print("Applying styles...")
 
-    # --- Add Nodes ---
-    for node in nx_subgraph.nodes():
-        if node == protein_name:
-            # Target Protein Styling
-            net.add_node(
-                node, 
-                label=node, 
-                title=f"TARGET: {node}", # Tooltip on hover
-                color=TARGET_COLOR, 
-                size=TARGET_SIZE,
-                borderWidth=2,
-                borderWidthSelected=4,
-                font={'size': 20, 'face': 'arial', 'vadjust': 5} # Push label down
-            )
-        else:
-            # Cluster Member Styling
-            net.add_node(
-                node, 
-                label=node, 
-                title=f"Cluster Member: {node}",
-                color=CLUSTER_COLOR, 
-                size=NODE_SIZE,
-                font={'size': 14, 'vadjust': 5} # Push label down
-            )
-
-    # --- Add Edges ---
-    for u, v, data in nx_subgraph.edges(data=True):
-        weight = data.get('weight', 1.0)
-        
-        # Check if this edge touches the target protein
-        if u == protein_name or v == protein_name:
-            net.add_edge(
-                u, v, 
-                width=TARGET_EDGE_WIDTH, 
-                color=TARGET_EDGE_COLOR,
-                title=f"Score: {weight}" # Hover text on line
-            )
-        else:
-            net.add_edge(
-                u, v, 
-                width=NORMAL_EDGE_WIDTH, 
-                color=BACKGROUND_EDGE_COLOR,
-                title=f"Score: {weight}"
-            )
+    # --- Nodes ---
+    # Target Protein Styling
+    target_style = {
+        "color": TARGET_COLOR,
+        "size": TARGET_SIZE,
+        "borderWidth": 2,
+        "borderWidthSelected": 4,
+        "font": {"size": 20, "face": "arial", "vadjust": 5, "color": "black"} # Push label down
+    }
+    # Cluster Member Styling
+    member_style = {
+        "color": CLUSTER_COLOR,
+        "size": NODE_SIZE,
+        "font": {"size": 14, "vadjust": 5, "color": "black"} # Push label down
+    }
+    node_records = [
+        {
+            "id": node,
+            "label": node,
+            "shape": "dot",
+            "title": f"TARGET: {node}" if node == protein_name else f"Cluster Member: {node}", # Tooltip on hover
+            **(target_style if node == protein_name else member_style)
+        }
+        for node in cluster_nodes
+    ]
+
+    # --- Edges ---
+    # Edges touching the target protein are fat and black, the rest thin and gray
+    target_row = cluster_nodes.index(protein_name)
+    edge_records = [
+        {
+            "from": cluster_nodes[i],
+            "to": cluster_nodes[j],
+            "width": TARGET_EDGE_WIDTH if target_row in (i, j) else NORMAL_EDGE_WIDTH,
+            "color": TARGET_EDGE_COLOR if target_row in (i, j) else BACKGROUND_EDGE_COLOR,
+            "title": f"Score: {weight}" # Hover text on line
+        }
+        for i, j, weight in cluster_edges
+    ]
+
+    # Assigns pyvis' internal node/edge lists directly (layout of pyvis 0.3.2, pinned in
+    # requirements.txt): add_nodes/add_edges loop over add_edge, which rescans every
+    # existing edge per call, and add_nodes rejects the font/border keys used above
+    net.nodes = node_records
+    net.node_ids = cluster_nodes
+    net.node_map = {rec["id"]: rec for rec in node_records}
+    net.edges = edge_records
 
     # 6. Physics Settings (The "Zoom/Scroll" Logic)
     # barnes_hut is the algorithm used to space nodes out. 
@@ -149,12 +158,15 @@ def create_interactive_plot(protein_name):
     except:
         print(f"Could not auto-open browser. Please open {output_path} manually.")
 
+def main():
+    # Default
+    target = "CHMP2B"
 
-# Default
-target = "CHMP2B"
-    
-# Command line argument override
-if len(sys.argv) > 1:
-    target = sys.argv[1]
-        
-create_interactive_plot(target)
\ No newline at end of file
+    # Command line argument override
+    if len(sys.argv) > 1:
+        target = sys.argv[1]
+
+    create_interactive_plot(target)
+
+if __name__ == "__main__":
+    main()
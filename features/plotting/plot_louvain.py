@@ -1,16 +1,23 @@
 import networkx as nx
 import matplotlib.pyplot as plt
-import pickle
+import numpy as np
 import os
 import sys
 
+# Layout cache and graph loader live next to the notebook modules
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prot_clust_modules"))
+from layout_cache import cached_layout
+from cluster_artifact import load_graph
+from graph_metrics import block_to_nx
+
 # ==========================================
 #        USER CONFIGURATION
 # ==========================================
 
 # File Paths
-INPUT_PICKLE_PATH = "data/output/louvain_annotated_graph.pkl"
+INPUT_GRAPH_PREFIX = "data/output/louvain_annotated_graph"  # .npz (CSR edges) + .parquet (protein, cluster_id)
 OUTPUT_PLOT_DIR = "data/output/plots"
+LAYOUT_CACHE_DIR = "data/output/layouts"  # Cached cluster layouts, reused by repeat plots
 
 # Visualization Settings
 TARGET_NODE_COLOR = "black"
@@ -20,48 +27,46 @@ NORMAL_EDGE_WIDTH = 0.5         # Thin edges for others
 NODE_SIZE = 300
 FONT_SIZE = 8
 LABEL_OFFSET_Y = 0.06           # How far under the node to push the label
+SPECTRAL_LAYOUT_LIMIT = 500     # Clusters larger than this get a spectral instead of a spring layout
 
 def plot_cluster(protein_name):
     print(f"--- Visualizing Cluster for: {protein_name} ---")
 
     # 1. Check Input File
-    if not os.path.exists(INPUT_PICKLE_PATH):
-        print(f"Error: Pickle file not found at {INPUT_PICKLE_PATH}")
-        print("Please run 'run_louvain_graph.py' first.")
+    if not os.path.exists(INPUT_GRAPH_PREFIX + ".npz"):
+        print(f"Error: Graph file not found at {INPUT_GRAPH_PREFIX}.npz")
+        print("Please run '01_run_louvain.py' first.")
         return
 
-    # 2. Load Graph Object (Unpickling)
-    print("Loading graph object...")
+    # 2. Load Graph (CSR adjacency + node table)
+    print("Loading graph...")
     try:
-        with open(INPUT_PICKLE_PATH, "rb") as f:
-            G = pickle.load(f)
+        A, nodes_df = load_graph(INPUT_GRAPH_PREFIX)
     except Exception as e:
         print(f"Error loading graph: {e}")
         return
 
+    names = nodes_df["protein"].to_numpy()
+    labels = nodes_df["cluster_id"].to_numpy()
+
     # 3. Validate Target Protein
-    if protein_name not in G.nodes:
+    target_idx = np.flatnonzero(names == protein_name)
+    if target_idx.size == 0:
         print(f"Error: Protein '{protein_name}' not found in the dataset.")
         return
 
     # 4. Extract Cluster
-    # Get the cluster ID stored in the target node's attributes
-    target_cluster_id = G.nodes[protein_name].get('cluster_id')
-    
-    if target_cluster_id is None:
-        print("Error: Node found, but it has no cluster_id. Did you run the Louvain script?")
-        return
-
+    target_cluster_id = int(labels[target_idx[0]])
     print(f"Protein found in Cluster ID: {target_cluster_id}")
 
-    # Find all nodes belonging to this cluster
-    cluster_nodes = [n for n, attrs in G.nodes(data=True) 
-                     if attrs.get('cluster_id') == target_cluster_id]
+    # Rows of all nodes belonging to this cluster
+    cluster_idx = np.flatnonzero(labels == target_cluster_id)
+    cluster_nodes = names[cluster_idx].tolist()
     
     print(f"Extracting subgraph with {len(cluster_nodes)} nodes...")
     
-    # Create the subgraph
-    H = G.subgraph(cluster_nodes)
+    # Graph of the cluster's CSR block (only the cluster is turned into NetworkX)
+    H = block_to_nx(A[cluster_idx][:, cluster_idx], cluster_nodes)
 
     # 5. Define Visual Styles
     print("Applying visual styles...")
@@ -87,9 +92,14 @@ def plot_cluster(protein_name):
             edge_widths.append(NORMAL_EDGE_WIDTH)
             edge_colors.append("lightgray") # Background edges lighter
 
-    # 6. Calculate Layout
-    # spring_layout positions nodes based on edge attraction (physics simulation)
-    pos = nx.spring_layout(H, seed=42, k=0.5) # k regulates distance between nodes
+    # 6. Calculate Layout (cached per cluster graph, so repeat plots skip it)
+    if len(H) > SPECTRAL_LAYOUT_LIMIT:
+        # The spring simulation is too slow for large clusters; spectral layout uses ARPACK
+        pos = cached_layout(H, LAYOUT_CACHE_DIR, prefix=f"cluster_{target_cluster_id}", method="spectral")
+    else:
+        # spring_layout positions nodes based on edge attraction (physics simulation)
+        # k regulates distance between nodes
+        pos = cached_layout(H, LAYOUT_CACHE_DIR, prefix=f"cluster_{target_cluster_id}", method="spring", seed=42, k=0.5)
 
     # 7. Create Label Positions (Shifted Down)
     pos_labels = {}
@@ -139,12 +149,15 @@ def plot_cluster(protein_name):
     # Show interactive window
     plt.show()
 
-
+def main():
     # Default protein if none provided
-target_protein = "CHMP2B"
-    
+    target_protein = "CHMP2B"
+
     # Allow running via command line: python plot_louvain.py SNCA
-if len(sys.argv) > 1:
-    target_protein = sys.argv[1]
-        
-plot_cluster(target_protein)
\ No newline at end of file
+    if len(sys.argv) > 1:
+        target_protein = sys.argv[1]
+
+    plot_cluster(target_protein)
+
+if __name__ == "__main__":
+    main()
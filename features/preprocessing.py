@@ -12,18 +12,15 @@ Original file is located at
 """
 
 #!pip install seaborn
-#!pip install python-louvain
 
 
 import pandas as pd
 import networkx as nx
-import community as community
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 import random
 import collections
-import community as community_louvain
 from networkx.algorithms.community.quality import modularity as calculate_modularity
 
 """## Load data
@@ -8,12 +8,18 @@ Description:
 
 import networkx as nx
 import pandas as pd
-import pickle
+import math
+import numpy as np
+import scipy.sparse
+import joblib
 import os
 import matplotlib.pyplot as plt
 import time
 import sys
 
+from layout_cache import cached_layout
+from graph_metrics import betweenness_csr, clustering_csr, degree_strength, block_to_nx, cluster_arrays
+
 # Try importing PyVis for interactive visualization
 try:
     from pyvis.network import Network
@@ -21,13 +27,16 @@ try:
 except ImportError:
     PYVIS_AVAILABLE = False
 
-def get_ranks(metric_dict, ascending=False):
+def get_ranks(values, ascending=False):
     """
-    Helper: Converts a dictionary of values {node: value} into rankings {node: rank}.
-    Rank 1 is the 'best' based on the sorting order.
+    Helper: Converts an array of metric values into rankings (same order as the input).
+    Rank 1 is the 'best' based on the sorting order; ties keep their input order.
     """
-    sorted_items = sorted(metric_dict.items(), key=lambda x: x[1], reverse=not ascending)
-    return {node: rank+1 for rank, (node, val) in enumerate(sorted_items)}
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values if ascending else -values, kind="stable")
+    ranks = np.empty(len(values), dtype=int)
+    ranks[order] = np.arange(1, len(values) + 1)
+    return ranks
 
 def btl_anal(
     target_protein, 
@@ -41,7 +50,8 @@ def btl_anal(
 
     Parameters:
         target_protein (str): The name of the protein to analyze (e.g., "SNCAIP").
-        pickle_path (str): Path to the .pkl file containing the graph and communities.
+        pickle_path (str): Path to the .pkl file containing the clustering (CSR matrix,
+                           node names and labels; older files: graph and communities).
         output_dir (str): Directory where CSV reports and Images will be saved.
         top_n (int): Number of top bottleneck candidates to return/display.
         large_cluster_limit (int): If a cluster is larger than this, use approximate 
@@ -67,67 +77,60 @@ def btl_anal(
         return {"error": f"Pickle file not found at {pickle_path}"}
 
     try:
-        with open(pickle_path, "rb") as f:
-            data = pickle.load(f)
-        G = data['graph']
-        communities = data['communities']
+        data = joblib.load(pickle_path, mmap_mode="r")
+        csr, all_nodes, labels = cluster_arrays(data)
     except Exception as e:
         return {"error": f"Failed to load pickle: {e}"}
 
     # --- 3. Locate Target ---
-    # Build node -> cluster mapping
-    node2cluster = {}
-    for cid, comm in enumerate(communities):
-        for n in comm:
-            node2cluster[n] = cid
-
-    if target_protein not in node2cluster:
+    target_idx = np.flatnonzero(all_nodes == target_protein)
+    if target_idx.size == 0 or labels[target_idx[0]] < 0:
         return {"error": f"Protein '{target_protein}' not found in the graph."}
 
-    cluster_id = node2cluster[target_protein]
-    target_nodes = communities[cluster_id]
+    cluster_id = int(labels[target_idx[0]])
+    idx = np.flatnonzero(labels == cluster_id)
+    nodes = all_nodes[idx].tolist()
     
-    print(f"[INFO] Found in Cluster #{cluster_id} (Size: {len(target_nodes)} nodes)")
+    print(f"[INFO] Found in Cluster #{cluster_id} (Size: {len(nodes)} nodes)")
 
     # --- 4. Subgraph & Metrics ---
-    # Create subgraph
-    subG = G.subgraph(target_nodes).copy()
+    # Slice the cluster's rows/columns out of the CSR matrix; all metrics run on it
+    A_sub = csr[idx][:, idx]
 
     print("[INFO] Calculating network metrics (Degree, Betweenness, Clustering)...")
     t0 = time.time()
 
     # Metrics
-    deg = dict(subG.degree())
-    clust = nx.clustering(subG, weight="weight")
+    deg_arr, _ = degree_strength(A_sub)
+    clust_arr = clustering_csr(A_sub)
 
-    # Betweenness Optimization
-    if len(subG) > large_cluster_limit:
+    # Betweenness Optimization (compiled Brandes)
+    if len(nodes) > large_cluster_limit:
         print(f"   > Cluster > {large_cluster_limit} nodes. Using k-approximation for speed.")
-        k_sample = int(len(subG) * 0.20) # Sample 20%
-        bc = nx.betweenness_centrality(subG, k=k_sample, weight="weight", normalized=True, seed=42)
+        # The sampling error shrinks with k, not with the cluster size, so the
+        # number of sources grows only with sqrt(n), clamped to 50-500
+        k_sample = min(500, max(50, int(math.sqrt(len(nodes)) * 5)))
+        bc_arr = betweenness_csr(A_sub, k=k_sample, seed=42)
     else:
-        bc = nx.betweenness_centrality(subG, weight="weight", normalized=True)
+        bc_arr = betweenness_csr(A_sub)
     
     print(f"   > Metrics computed in {time.time() - t0:.2f}s")
 
     # --- 5. Ranking (Bottleneck Score) ---
     # Rule: High BC + High Degree + Low Clustering = Good Bottleneck
-    rank_bc = get_ranks(bc, ascending=False)
-    rank_deg = get_ranks(deg, ascending=False)
-    rank_clust = get_ranks(clust, ascending=True)
-
-    results = []
-    for node in subG.nodes():
-        score = rank_bc[node] + rank_deg[node] + rank_clust[node]
-        results.append({
-            "Protein": node,
-            "Total_Score": score,
-            "BC": bc[node],
-            "Degree": deg[node],
-            "Clustering": clust[node]
-        })
-
-    df = pd.DataFrame(results).sort_values("Total_Score").reset_index(drop=True)
+    total_score = (
+        get_ranks(bc_arr, ascending=False)
+        + get_ranks(deg_arr, ascending=False)
+        + get_ranks(clust_arr, ascending=True)
+    )
+
+    df = pd.DataFrame({
+        "Protein": nodes,
+        "Total_Score": total_score,
+        "BC": bc_arr,
+        "Degree": deg_arr,
+        "Clustering": clust_arr
+    }).sort_values("Total_Score").reset_index(drop=True)
     
     # Save CSV
     csv_path = os.path.join(output_dir, f"bottlenecks_cluster_{cluster_id}.csv")
@@ -136,10 +139,15 @@ def btl_anal(
     # Get top candidates for highlighting
     top_candidates = df.head(top_n)["Protein"].tolist()
 
+    # NetworkX graph of the cluster, only used for drawing
+    subG = block_to_nx(A_sub, nodes)
+
     # --- 6. Static Plot (Matplotlib) ---
     print("[INFO] Generating static PNG...")
     plt.figure(figsize=(10, 8))
-    pos = nx.spring_layout(subG, seed=42)
+    # Cached per cluster graph; large clusters get a spectral layout (ARPACK) instead of the spring simulation
+    layout_method = "spectral" if len(subG) > large_cluster_limit else "spring"
+    pos = cached_layout(subG, os.path.join(output_dir, "layouts"), prefix=f"cluster_{cluster_id}", method=layout_method, seed=42)
     
     # Draw Background
     nx.draw_networkx_nodes(subG, pos, node_size=50, node_color='lightgrey', alpha=0.6)
@@ -153,9 +161,9 @@ def btl_anal(
     nx.draw_networkx_nodes(subG, pos, nodelist=bottlenecks_draw, node_color='blue', node_size=150, label="Bottlenecks")
 
     # Labels
-    labels = {n: n for n in top_candidates}
-    labels[target_protein] = target_protein
-    nx.draw_networkx_labels(subG, pos, labels=labels, font_size=8, font_weight='bold')
+    node_labels = {n: n for n in top_candidates}
+    node_labels[target_protein] = target_protein
+    nx.draw_networkx_labels(subG, pos, labels=node_labels, font_size=8, font_weight='bold')
 
     plt.title(f"Cluster {cluster_id}: {target_protein}")
     plt.axis("off")
@@ -179,26 +187,30 @@ def btl_anal(
         else:
             nt.force_atlas_2based()
 
-        for node in subG.nodes():
-            # Tooltip
-            title_str = (f"<b>{node}</b><br>"
-                         f"Score: {df.loc[df['Protein']==node, 'Total_Score'].values[0]}<br>"
-                         f"BC: {bc[node]:.4f}<br>"
-                         f"Deg: {deg[node]}")
-            
-            # Color Logic
-            color = "#97c2fc" # Default blue
-            size = 10
-            
-            if node == target_protein:
-                color = "#ff0000"; size = 30; title_str += "<br>(TARGET)"
-            elif node in top_candidates:
-                color = "#00ff00"; size = 20; title_str += "<br>(BOTTLENECK)"
-
-            nt.add_node(node, title=title_str, color=color, size=size)
-
-        for u, v in subG.edges():
-            nt.add_edge(u, v, color="#cccccc")
+        # Node/edge records are built in one pass and handed to PyVis as a whole
+        top_set = set(top_candidates)
+        styles = {"target": ("#ff0000", 30, "<br>(TARGET)"), "top": ("#00ff00", 20, "<br>(BOTTLENECK)"), "other": ("#97c2fc", 10, "")}
+        roles = ["target" if n == target_protein else "top" if n in top_set else "other" for n in nodes]
+
+        node_records = [
+            {
+                "id": n, "label": n, "shape": "dot", "font": {"color": "black"},
+                "color": styles[role][0], "size": styles[role][1],
+                # Tooltip
+                "title": f"<b>{n}</b><br>Score: {s}<br>BC: {b:.4f}<br>Deg: {d}{styles[role][2]}"
+            }
+            for n, role, s, b, d in zip(nodes, roles, total_score.tolist(), bc_arr.tolist(), deg_arr.tolist())
+        ]
+        # Each undirected edge once: upper triangle of the cluster block
+        upper = scipy.sparse.triu(A_sub).tocoo()
+        edge_records = [{"from": nodes[i], "to": nodes[j], "color": "#cccccc"} for i, j in zip(upper.row.tolist(), upper.col.tolist())]
+
+        # pyvis' internal node/edge lists (layout of pyvis 0.3.2, pinned in requirements.txt);
+        # the public add_nodes/add_edges wrappers call add_edge once per edge
+        nt.nodes = node_records
+        nt.node_ids = list(nodes)
+        nt.node_map = {rec["id"]: rec for rec in node_records}
+        nt.edges = edge_records
 
         html_path = os.path.join(img_dir, f"cluster_{cluster_id}_interactive.html")
         nt.save_graph(html_path)
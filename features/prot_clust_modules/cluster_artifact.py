@@ -0,0 +1,105 @@
+"""
+Module: cluster_artifact.py
+Description:
+    Compact on-disk format for a clustering result.
+    A single .npz file holds the weighted adjacency as CSR arrays, the node
+    names, one integer cluster label per node and a small JSON metadata block
+    (modularity, parameters). Loading it only reads flat NumPy arrays - no
+    Python object graph has to be rebuilt as with a pickled nx.Graph.
+    The annotated graph used by the plotting scripts is stored as a pair of
+    files instead: <prefix>.npz (scipy.sparse.save_npz) for the edges and
+    <prefix>.parquet for the node table (protein, cluster_id).
+"""
+
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse
+
+class ClusterArtifactError(Exception):
+    """Raised when a clustering file (.npz artifact or pickled bundle) is missing or unreadable."""
+
+def save_cluster_artifact(path, adjacency, nodes, labels, modularity=None, params=None):
+    """
+    Saves a clustering result as a single .npz file.
+
+    Parameters:
+        path (str): Output file path (.npz).
+        adjacency (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        nodes (list or np.ndarray): Node name for every row/column of the adjacency.
+        labels (list or np.ndarray): Cluster ID for every node.
+        modularity (float): Modularity score of the clustering.
+        params (dict): Parameters used to produce the clustering.
+    """
+    A = scipy.sparse.csr_array(adjacency)
+    meta = {"modularity": modularity, "params": params or {}}
+
+    np.savez(
+        path,
+        data=A.data,
+        indices=A.indices,
+        indptr=A.indptr,
+        shape=np.asarray(A.shape),
+        nodes=np.asarray(nodes, dtype=str),
+        labels=np.asarray(labels, dtype=np.int32),
+        meta=np.asarray(json.dumps(meta))
+    )
+
+def load_cluster_artifact(path):
+    """
+    Loads a clustering result written by save_cluster_artifact.
+
+    Parameters:
+        path (str): Path to the .npz file.
+
+    Returns:
+        dict: A dictionary containing:
+            - "adjacency": scipy.sparse.csr_array of edge weights.
+            - "nodes": np.ndarray of node names (row order of the adjacency).
+            - "labels": np.ndarray (int32) cluster ID per node.
+            - "modularity": Modularity score (or None).
+            - "params": Parameters used for the clustering.
+    """
+    with np.load(path, allow_pickle=False) as f:
+        A = scipy.sparse.csr_array((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+        meta = json.loads(str(f["meta"]))
+        return {
+            "adjacency": A,
+            "nodes": f["nodes"],
+            "labels": f["labels"],
+            "modularity": meta["modularity"],
+            "params": meta["params"]
+        }
+
+def save_annotated_graph(prefix, adjacency, nodes, labels):
+    """
+    Saves a cluster-annotated graph as <prefix>.npz + <prefix>.parquet.
+
+    Parameters:
+        prefix (str): Output path without extension.
+        adjacency (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        nodes (list or np.ndarray): Node name for every row/column of the adjacency.
+        labels (list or np.ndarray): Cluster ID for every node.
+    """
+    scipy.sparse.save_npz(prefix + ".npz", scipy.sparse.csr_matrix(adjacency))
+    table = pa.table({
+        "protein": np.asarray(nodes, dtype=str),
+        "cluster_id": np.asarray(labels, dtype=np.int32)
+    })
+    pq.write_table(table, prefix + ".parquet")
+
+def load_graph(prefix):
+    """
+    Loads a graph written by save_annotated_graph.
+
+    Parameters:
+        prefix (str): Path without extension.
+
+    Returns:
+        tuple: (scipy.sparse.csr_matrix, pd.DataFrame) - the adjacency and the node
+               table (columns protein, cluster_id; row i is row i of the adjacency).
+    """
+    A = scipy.sparse.load_npz(prefix + ".npz").tocsr()
+    nodes_df = pq.read_table(prefix + ".parquet").to_pandas()
+    return A, nodes_df
@@ -5,26 +5,99 @@ Description:
     1. Summary of the whole network (modularity, sizes) - Displays all.
     2. Detailed statistics table for every cluster - Displays Top 20.
     3. Extraction of protein lists from specific clusters - Displays Top 50.
+    Accepts either the pickled bundle (.pkl) or the compact cluster artifact
+    (.npz, see cluster_artifact.py); the summary and protein lists only need the
+    node names and labels, never the graph.
 """
 
+import functools
 import pandas as pd
-import networkx as nx
 import numpy as np
-import pickle
+import joblib
 import os
-from IPython.display import display
+import html
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from graph_metrics import cluster_arrays, cluster_stats_csr
+from cluster_artifact import load_cluster_artifact, ClusterArtifactError
+from notebook_utils import in_notebook
+
+@functools.lru_cache(maxsize=4)
+def _load_pickle_cached(pickle_path, mtime, size):
+    """Loads a bundle once per (path, mtime, size); a rewritten file gets a new key."""
+    if pickle_path.endswith(".npz"):
+        # Flat arrays (CSR, names, labels) + JSON metadata, no object graph to rebuild
+        return load_cluster_artifact(pickle_path)
+    # joblib reads plain pickles too; arrays in joblib dumps are memory-mapped
+    return joblib.load(pickle_path, mmap_mode="r")
+
+def _node_labels(data):
+    """Helper: (nodes, labels) arrays of a loaded bundle or artifact."""
+    if "labels" in data:
+        return np.asarray(data["nodes"]), np.asarray(data["labels"])
+    # Bundles written before the arrays were added: flatten the communities
+    communities = data["communities"]
+    nodes = np.asarray([n for c in communities for n in c])
+    labels = np.repeat(np.arange(len(communities)), [len(c) for c in communities])
+    return nodes, labels
+
+def _gradient_table_html(df, gradient_column, cmap="Blues", float_format="{:.4f}"):
+    """
+    Helper: Static HTML table with a color gradient on one column.
+    Same look as Styler.background_gradient, but the colors are computed in one
+    vectorized colormap call and the table is assembled directly as a string.
+    """
+    # Only the notebook tables need colors; scripts never import matplotlib here
+    import matplotlib as mpl
+
+    values = df[gradient_column].to_numpy(dtype=float)
+    norm = mpl.colors.Normalize(vmin=values.min(), vmax=values.max()) if len(values) else None
+    rgba = mpl.colormaps[cmap](norm(values)) if len(values) else np.empty((0, 4))
+    # Dark cells get light text (Styler's luminance rule)
+    lum = rgba[:, :3] @ np.array([0.2126, 0.7152, 0.0722])
+    styles = [
+        f"background-color: {mpl.colors.to_hex(c)}; color: {'#f1f1f1' if l < 0.408 else '#000000'}"
+        for c, l in zip(rgba, lum)
+    ]
+
+    def cell(value):
+        return float_format.format(value) if isinstance(value, float) else html.escape(str(value))
+
+    col_idx = df.columns.get_loc(gradient_column)
+    header = "".join(f"<th>{html.escape(str(c))}</th>" for c in df.columns)
+    rows = [
+        "<tr>" + "".join(
+            f'<td style="{styles[i]}">{cell(v)}</td>' if j == col_idx else f"<td>{cell(v)}</td>"
+            for j, v in enumerate(row)
+        ) + "</tr>"
+        for i, row in enumerate(df.itertuples(index=False))
+    ]
+    return f"<table><thead><tr>{header}</tr></thead><tbody>{''.join(rows)}</tbody></table>"
+
+def _cluster_count(labels, pickle_path):
+    """
+    Helper: number of clusters (highest label + 1).
+    Raises ClusterArtifactError if the file has no clustered node at all.
+    """
+    if labels.size == 0 or labels.max() < 0:
+        raise ClusterArtifactError(f"No clustered nodes in {pickle_path}")
+    return int(labels.max()) + 1
 
 def _load_pickle_data(pickle_path):
-    """Helper function to load data safely."""
-    if not os.path.exists(pickle_path):
-        return None, f"File not found: {pickle_path}"
-    
+    """
+    Helper function to load data safely (cached across the overview functions).
+    Raises ClusterArtifactError if the file is missing or cannot be read.
+    """
+    try:
+        st = os.stat(pickle_path)
+    except FileNotFoundError:
+        raise ClusterArtifactError(f"File not found: {pickle_path}") from None
+
     try:
-        with open(pickle_path, "rb") as f:
-            data = pickle.load(f)
-        return data, None
+        return _load_pickle_cached(os.path.abspath(pickle_path), st.st_mtime_ns, st.st_size)
     except Exception as e:
-        return None, str(e)
+        raise ClusterArtifactError(str(e)) from e
 
 def get_clustering_summary(pickle_path):
     """
@@ -38,19 +111,21 @@ def get_clustering_summary(pickle_path):
     """
     print(f"\n[OVERVIEW] Generating global network summary...")
     
-    data, error = _load_pickle_data(pickle_path)
-    if error:
-        print(f"❌ Error: {error}")
+    try:
+        data = _load_pickle_data(pickle_path)
+        _, labels = _node_labels(data)
+        n_clusters = _cluster_count(labels, pickle_path)
+    except ClusterArtifactError as e:
+        print(f"❌ Error: {e}")
         return None
 
-    communities = data['communities']
-    modularity_score = data.get('modularity', 0.0)
+    modularity_score = data.get('modularity') or 0.0
 
-    # Calculate size statistics
-    cluster_sizes = [len(c) for c in communities]
+    # Calculate size statistics (one bincount over the labels)
+    cluster_sizes = np.bincount(labels[labels >= 0], minlength=n_clusters)
     
     summary_data = {
-        "Total Clusters": [len(communities)],
+        "Total Clusters": [n_clusters],
         "Avg Cluster Size": [round(np.mean(cluster_sizes), 2)],
         "Median Cluster Size": [np.median(cluster_sizes)],
         "Largest Cluster": [np.max(cluster_sizes)],
@@ -62,7 +137,11 @@ def get_clustering_summary(pickle_path):
     
     # DISPLAY OUTPUT
     print("\n--- Network Summary ---")
-    display(df_summary.style.hide(axis='index'))
+    if in_notebook():
+        from IPython.display import display
+        display(df_summary.style.hide(axis='index'))
+    else:
+        print(df_summary.to_string(index=False))
     
     return df_summary
 
@@ -80,48 +159,52 @@ def generate_cluster_stats_table(pickle_path, output_filename, output_dir="data/
     """
     print(f"\n[OVERVIEW] Calculating statistics for all clusters...")
     
-    data, error = _load_pickle_data(pickle_path)
-    if error:
-        print(f"❌ Error: {error}")
+    try:
+        data = _load_pickle_data(pickle_path)
+        # CSR adjacency + cluster ID per row; all clusters are measured together
+        A, _, labels = cluster_arrays(data)
+        n_clusters = _cluster_count(labels, pickle_path)
+    except ClusterArtifactError as e:
+        print(f"❌ Error: {e}")
         return None
 
-    G = data['graph']
-    communities = data['communities']
-    
-    stats_rows = []
-
-    for cluster_id, nodes in enumerate(communities):
-        subG = G.subgraph(nodes)
-        
-        num_nodes = subG.number_of_nodes()
-        num_edges = subG.number_of_edges()
-        density = nx.density(subG)
-        
-        try:
-            avg_clust = nx.average_clustering(subG, weight="weight")
-        except:
-            avg_clust = 0.0
-
-        stats_rows.append({
-            "Cluster ID": cluster_id,
-            "Size (Nodes)": num_nodes,
-            "Edges": num_edges,
-            "Density": round(density, 4),
-            "Avg Clustering": round(avg_clust, 4)
-        })
-
-    # Sort by Size
-    df = pd.DataFrame(stats_rows).sort_values(by="Size (Nodes)", ascending=False).reset_index(drop=True)
-
-    # Save to CSV
+    # Nodes outside every community (label -1) take no part in any cluster subgraph
+    inside = np.flatnonzero(labels >= 0)
+    if inside.size < len(labels):
+        A, labels = A[inside][:, inside], labels[inside]
+
+    # Edges, density and clustering in one compiled pass (sparse products without Numba)
+    sizes, edges, density, avg_clust = cluster_stats_csr(A, labels, n_clusters)
+
+    df = pd.DataFrame({
+        "Cluster ID": np.arange(n_clusters),
+        "Size (Nodes)": sizes,
+        "Edges": edges,
+        "Density": density.round(4),
+        "Avg Clustering": avg_clust.round(4)
+    })
+
+    # Sort by Size (clusterings are stored largest first; only older files need it)
+    if np.any(sizes[1:] > sizes[:-1]):
+        df = df.sort_values(by="Size (Nodes)", ascending=False, kind="stable").reset_index(drop=True)
+
+    # Save to CSV (Arrow's columnar C++ writer instead of pandas' row-by-row one)
     os.makedirs(output_dir, exist_ok=True)
     full_path = os.path.join(output_dir, output_filename)
-    df.to_csv(full_path, index=False)
+    pacsv.write_csv(
+        pa.Table.from_pandas(df, preserve_index=False),
+        full_path,
+        write_options=pacsv.WriteOptions(quoting_style="needed")
+    )
     print(f"   ✅ Stats saved to: {full_path}")
 
     # DISPLAY OUTPUT (Top 20)
     print("\n--- Top 20 Largest Clusters ---")
-    display(df.head(20).style.format({"Density": "{:.4f}", "Avg Clustering": "{:.4f}"}).background_gradient(subset=["Size (Nodes)"], cmap="Blues"))
+    if in_notebook():
+        from IPython.display import display, HTML
+        display(HTML(_gradient_table_html(df.head(20), "Size (Nodes)", cmap="Blues")))
+    else:
+        print(df.head(20).to_string(index=False, float_format="{:.4f}".format))
     
     return df
 
@@ -140,26 +223,28 @@ def get_proteins_in_cluster(pickle_path, cluster_id, output_filename, output_dir
     """
     print(f"\n[OVERVIEW] Fetching proteins for Cluster ID {cluster_id}...")
 
-    data, error = _load_pickle_data(pickle_path)
-    if error:
-        print(f"❌ Error: {error}")
+    try:
+        data = _load_pickle_data(pickle_path)
+        nodes, labels = _node_labels(data)
+        n_clusters = _cluster_count(labels, pickle_path)
+    except ClusterArtifactError as e:
+        print(f"❌ Error: {e}")
         return None
 
-    communities = data['communities']
-
-    if cluster_id < 0 or cluster_id >= len(communities):
+    if cluster_id < 0 or cluster_id >= n_clusters:
         print(f"❌ Error: Cluster ID {cluster_id} invalid.")
         return None
 
-    protein_list = sorted(list(communities[cluster_id]))
+    # Sorted in NumPy, converted to Python strings once
+    protein_list = np.sort(nodes[labels == cluster_id]).tolist()
     
-    # Save to file
+    # Save to file (one buffered write, one protein per line)
     os.makedirs(output_dir, exist_ok=True)
     full_path = os.path.join(output_dir, output_filename)
     
     with open(full_path, "w") as f:
-        for protein in protein_list:
-            f.write(f"{protein}\n")
+        if protein_list:
+            f.write("\n".join(protein_list) + "\n")
 
     print(f"   ✅ Saved list to: {full_path}")
 
@@ -8,17 +8,34 @@ Description:
 """
 
 import pandas as pd
-import pickle
+import numpy as np
+import joblib
+import hashlib
 import os
 import sys
-from IPython.display import display
+import importlib.util
 
-# Try importing gseapy
-try:
-    import gseapy as gp
-    GSEAPY_AVAILABLE = True
-except ImportError:
-    GSEAPY_AVAILABLE = False
+from notebook_utils import in_notebook
+
+# gseapy (and its requests/matplotlib stack) is only imported when an analysis
+# actually runs; here we only check that it is installed
+GSEAPY_AVAILABLE = importlib.util.find_spec("gseapy") is not None
+
+GENE_SETS = 'MSigDB_Hallmark_2020'
+ORGANISM = 'Human'
+
+def _enrichr_cache_path(output_dir, target_gene_list, background_gene_list):
+    """
+    Helper: Parquet file holding the Enrichr results for this gene list and background.
+    The key is a SHA-256 of both sorted lists (plus library and organism), so the
+    same request always maps to the same file, whatever the input order.
+    """
+    h = hashlib.sha256()
+    h.update(f"{GENE_SETS}|{ORGANISM}|".encode())
+    h.update("\n".join(sorted(target_gene_list)).encode())
+    h.update(b"|")
+    h.update("\n".join(sorted(background_gene_list)).encode())
+    return os.path.join(output_dir, ".enrichr_cache", f"{h.hexdigest()}.parquet")
 
 def run_enrichment_analysis(target_protein, pickle_path, output_dir):
     """
@@ -38,6 +55,8 @@ def run_enrichment_analysis(target_protein, pickle_path, output_dir):
         print("   Run: pip install gseapy")
         return None
 
+    import gseapy as gp
+
     print(f"\n--- 🧬 Enrichment Analysis: {target_protein} ---")
 
     # --- 1. Load Data ---
@@ -46,40 +65,39 @@ def run_enrichment_analysis(target_protein, pickle_path, output_dir):
         return None
 
     try:
-        with open(pickle_path, "rb") as f:
-            data = pickle.load(f)
+        data = joblib.load(pickle_path, mmap_mode="r")
         
-        # We need communities list and graph nodes for background
-        communities = data['communities']
-        G = data['graph']
-        
-        # Rebuild node map if needed (or use existing)
-        if 'node2cluster' in data:
-            node2cluster = data['node2cluster']
+        if 'labels' in data:
+            # Node names + cluster ID per node, stored with the clustering:
+            # no lookup dictionary to rebuild and no graph to load
+            nodes = np.asarray(data['nodes'])
+            labels = np.asarray(data['labels'])
         else:
-            node2cluster = {}
-            for cid, comm in enumerate(communities):
-                for node in comm:
-                    node2cluster[node] = cid
+            # Older bundles: communities list and graph nodes for background
+            communities = data['communities']
+            nodes = np.asarray(list(data['graph']))
+            node2cluster = data.get('node2cluster') or {n: cid for cid, comm in enumerate(communities) for n in comm}
+            labels = np.array([node2cluster.get(n, -1) for n in nodes.tolist()])
 
     except Exception as e:
         print(f"❌ Error loading pickle: {e}")
         return None
 
     # --- 2. Identify Target Cluster ---
-    if target_protein not in node2cluster:
+    target_idx = np.flatnonzero(nodes == target_protein)
+    if target_idx.size == 0 or labels[target_idx[0]] < 0:
         print(f"❌ Error: Protein '{target_protein}' not found in the graph.")
         return None
 
-    cluster_id = node2cluster[target_protein]
-    target_gene_list = list(communities[cluster_id])
+    cluster_id = int(labels[target_idx[0]])
+    target_gene_list = nodes[labels == cluster_id].tolist()
     
     print(f"[INFO] Target found in Cluster #{cluster_id}")
     print(f"[INFO] Analyzing {len(target_gene_list)} genes against Hallmark pathways...")
 
     # --- 3. Define Background ---
     # Background is ALL nodes in the graph
-    background_gene_list = list(G.nodes())
+    background_gene_list = nodes.tolist()
     print(f"[INFO] Background size: {len(background_gene_list)} genes")
 
     # --- 4. Run ORA with gseapy ---
@@ -90,21 +108,31 @@ def run_enrichment_analysis(target_protein, pickle_path, output_dir):
         # Alternatively, use 'prerank' or 'enrich' if you have local .gmt files.
         # Using 'MSigDB_Hallmark_2020' is a safe standard.
         
-        enr = gp.enrichr(
-            gene_list=target_gene_list,
-            gene_sets='MSigDB_Hallmark_2020', # Uses online library
-            background=background_gene_list,
-            organism='Human',
-            outdir=None, # Don't auto-save, we handle it manually
-            verbose=False
-        )
-
-        if enr.results is None or enr.results.empty:
+        # Identical requests (same cluster, same background) are answered from disk
+        cache_path = _enrichr_cache_path(output_dir, target_gene_list, background_gene_list)
+        if os.path.exists(cache_path):
+            print("[INFO] Using cached Enrichr results.")
+            enr_results = pd.read_parquet(cache_path)
+        else:
+            enr = gp.enrichr(
+                gene_list=target_gene_list,
+                gene_sets=GENE_SETS, # Uses online library
+                background=background_gene_list,
+                organism=ORGANISM,
+                outdir=None, # Don't auto-save, we handle it manually
+                verbose=False
+            )
+            enr_results = enr.results
+            if enr_results is not None:
+                os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+                enr_results.to_parquet(cache_path, index=False)
+
+        if enr_results is None or enr_results.empty:
             print("[RESULT] No statistically significant pathways found.")
             return None
         
         # Process results
-        results_df = enr.results.sort_values('Adjusted P-value')
+        results_df = enr_results.sort_values('Adjusted P-value')
         
         # Filter for significant results (optional threshold, e.g. 0.05)
         sig_results = results_df[results_df['Adjusted P-value'] < 0.05]
@@ -122,15 +150,22 @@ def run_enrichment_analysis(target_protein, pickle_path, output_dir):
         
         if not sig_results.empty:
             # Format for display (scientific notation for p-values)
-            display_df = sig_results[cols_to_show].head(10).style.format({
-                'P-value': '{:.2e}',
-                'Adjusted P-value': '{:.2e}'
-            })
-            display(display_df)
+            p_format = {'P-value': '{:.2e}', 'Adjusted P-value': '{:.2e}'}
+            if in_notebook():
+                from IPython.display import display
+                display(sig_results[cols_to_show].head(10).style.format(p_format))
+            else:
+                print(sig_results[cols_to_show].head(10).to_string(
+                    index=False, formatters={c: f.format for c, f in p_format.items()}
+                ))
         else:
             print("No pathways met the significance threshold (Adj. P < 0.05).")
             print("Showing top 5 raw results instead:")
-            display(results_df[cols_to_show].head(5))
+            if in_notebook():
+                from IPython.display import display
+                display(results_df[cols_to_show].head(5))
+            else:
+                print(results_df[cols_to_show].head(5).to_string(index=False))
 
         return results_df
 
@@ -0,0 +1,680 @@
+"""
+Module: graph_metrics.py
+Description:
+    Vectorized graph statistics computed on a SciPy CSR adjacency matrix.
+    Each function works on the whole graph at once together with an integer
+    cluster label per node, instead of looping over NetworkX subgraphs.
+"""
+
+import itertools
+import random
+import numpy as np
+import pandas as pd
+import networkx as nx
+import scipy.sparse
+
+# igraph is only needed for the C-backed community/centrality routines
+try:
+    import igraph as ig
+    IGRAPH_AVAILABLE = True
+except ImportError:
+    IGRAPH_AVAILABLE = False
+
+# Numba compiles the weighted clustering and betweenness kernels (NetworkX is used otherwise)
+try:
+    import numba
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+def graph_to_csr(G, nodes_list=None, weight="weight"):
+    """
+    Converts a NetworkX graph into a weighted CSR adjacency matrix.
+
+    Parameters:
+        G (nx.Graph): The graph to convert.
+        nodes_list (list): Node order for the rows/columns (defaults to G's order).
+        weight (str): Edge attribute used as the matrix value.
+
+    Returns:
+        tuple: (nodes_list, scipy.sparse.csr_array)
+    """
+    if nodes_list is None:
+        nodes_list = list(G)
+    A = nx.to_scipy_sparse_array(G, nodelist=nodes_list, weight=weight, format="csr")
+    return nodes_list, A
+
+def _pairs_to_csr(src, dst, w, n):
+    """Symmetric CSR from coded edge endpoints; each unordered pair is kept once (last row wins)."""
+    n_edges = len(w)
+    # Canonical (low, high) pair per row; keep the last occurrence of every pair
+    lo = np.minimum(src, dst).astype(np.int64)
+    hi = np.maximum(src, dst).astype(np.int64)
+    _, first_rev = np.unique((lo * n + hi)[::-1], return_index=True)
+    keep = n_edges - 1 - first_rev
+    lo, hi, w = lo[keep], hi[keep], w[keep]
+
+    # Mirror the off-diagonal entries; self-loops appear once on the diagonal
+    off = lo != hi
+    rows = np.concatenate([lo, hi[off]])
+    cols = np.concatenate([hi, lo[off]])
+    data = np.concatenate([w, w[off]])
+    return scipy.sparse.coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+
+def csv_to_csr(path, source="protein1", target="protein2", weight="combined_score", chunksize=500_000, dtype=np.float32, scale=1.0):
+    """
+    Streams an edge-list CSV into the symmetric weighted CSR adjacency without
+    ever holding the full DataFrame. A first pass collects the node names and
+    the edge count; the second pass writes each chunk's integer codes and
+    weights into pre-allocated buffers, which become one COO matrix at the end.
+    Like nx.from_pandas_edgelist, each unordered pair is kept once (last row wins).
+
+    Parameters:
+        path (str): CSV file with the edge list.
+        source (str): Column with the first node of each edge.
+        target (str): Column with the second node of each edge.
+        weight (str): Column with the edge weight.
+        chunksize (int): Rows per chunk.
+        dtype (np.dtype): Weight dtype of the buffers and the matrix.
+        scale (float): Factor applied to the weights while they are copied into the buffer.
+
+    Returns:
+        tuple: (nodes, scipy.sparse.csr_matrix) - node name per row and the adjacency.
+    """
+    # Pass 1: node names (first-seen order) and number of edges
+    index = {}
+    n_edges = 0
+    for chunk in pd.read_csv(path, usecols=[source, target], dtype=str, chunksize=chunksize):
+        for name in pd.unique(chunk[[source, target]].to_numpy().ravel()):
+            index.setdefault(name, len(index))
+        n_edges += len(chunk)
+    nodes = np.asarray(list(index), dtype=str)
+    node_index = pd.Index(nodes)
+
+    # Pass 2: codes and weights straight into the pre-allocated buffers
+    row_buf = np.empty(n_edges, dtype=np.int64)
+    col_buf = np.empty(n_edges, dtype=np.int64)
+    data_buf = np.empty(n_edges, dtype=dtype)
+    pos = 0
+    reader = pd.read_csv(path, usecols=[source, target, weight], dtype={source: str, target: str, weight: dtype}, chunksize=chunksize)
+    for chunk in reader:
+        end = pos + len(chunk)
+        row_buf[pos:end] = node_index.get_indexer(chunk[source])
+        col_buf[pos:end] = node_index.get_indexer(chunk[target])
+        # Scaling is fused into the buffer copy (no extra pass, stays in dtype)
+        np.multiply(chunk[weight].to_numpy(), dtype(scale), out=data_buf[pos:end])
+        pos = end
+
+    return nodes, _pairs_to_csr(row_buf, col_buf, data_buf, len(nodes))
+
+def _density(sizes, edges):
+    """
+    Density 2E / (N(N-1)) of every cluster straight from its node and edge
+    counts (what nx.density returns for the subgraph, without building it);
+    defined as 0 for clusters with fewer than 2 nodes.
+    """
+    density = np.zeros(len(sizes))
+    multi = sizes > 1
+    density[multi] = 2.0 * edges[multi] / (sizes[multi] * (sizes[multi] - 1))
+    return density
+
+def cluster_edge_stats(A, labels, n_clusters):
+    """
+    Computes size, internal edge count and density for every cluster in one sweep.
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric adjacency matrix.
+        labels (np.ndarray): Cluster ID per row/column of A.
+        n_clusters (int): Total number of clusters.
+
+    Returns:
+        tuple: (sizes, edges, density) as NumPy arrays indexed by cluster ID.
+    """
+    sizes = np.bincount(labels, minlength=n_clusters)
+
+    # Upper triangle (incl. diagonal) so every undirected edge is counted once
+    upper = scipy.sparse.triu(A, format="coo")
+    same = labels[upper.row] == labels[upper.col]
+    edges = np.bincount(labels[upper.row[same]], minlength=n_clusters)
+
+    return sizes, edges, _density(sizes, edges)
+
+def degree_strength(A):
+    """
+    Node degree and strength from one sweep over the CSR arrays.
+    Self-loops count twice in both, as in NetworkX.
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+
+    Returns:
+        tuple: (degree, strength) as NumPy arrays indexed by row.
+    """
+    A = scipy.sparse.csr_array(A)
+    diag = A.diagonal()
+    degree = np.diff(A.indptr) + (diag != 0)
+    strength = np.asarray(A.sum(axis=1)).ravel() + diag
+    return degree, strength
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def _heap_push(keys, vals, size, key, val):
+        """Pushes (key, val) onto a binary min-heap stored in two arrays."""
+        i = size
+        keys[i] = key
+        vals[i] = val
+        while i > 0:
+            parent = (i - 1) // 2
+            if keys[parent] <= keys[i]:
+                break
+            keys[parent], keys[i] = keys[i], keys[parent]
+            vals[parent], vals[i] = vals[i], vals[parent]
+            i = parent
+        return size + 1
+
+    @njit(cache=True)
+    def _heap_pop(keys, vals, size):
+        """Pops the smallest (key, val) from the heap; returns (key, val, new size)."""
+        key, val = keys[0], vals[0]
+        size -= 1
+        keys[0] = keys[size]
+        vals[0] = vals[size]
+        i = 0
+        while True:
+            left = 2 * i + 1
+            smallest = i
+            if left < size and keys[left] < keys[smallest]:
+                smallest = left
+            if left + 1 < size and keys[left + 1] < keys[smallest]:
+                smallest = left + 1
+            if smallest == i:
+                break
+            keys[smallest], keys[i] = keys[i], keys[smallest]
+            vals[smallest], vals[i] = vals[i], vals[smallest]
+            i = smallest
+        return key, val, size
+
+    @njit(parallel=True, cache=True)
+    def _brandes_kernel(indptr, indices, data, sources, n_chunks):
+        """
+        Weighted Brandes accumulation (edge weights are distances, endpoints excluded).
+        Sources are split into n_chunks; each chunk accumulates into its own row.
+        """
+        n = indptr.size - 1
+        partial = np.zeros((n_chunks, n))
+        for c in prange(n_chunks):
+            dist = np.empty(n)
+            sigma = np.empty(n)
+            delta = np.empty(n)
+            order = np.empty(n, dtype=np.int64)
+            done = np.empty(n, dtype=np.bool_)
+            heap_keys = np.empty(indices.size + 1)
+            heap_vals = np.empty(indices.size + 1, dtype=np.int64)
+            for t in range(c, sources.size, n_chunks):
+                s = sources[t]
+                dist[:] = np.inf
+                sigma[:] = 0.0
+                delta[:] = 0.0
+                done[:] = False
+                dist[s] = 0.0
+                sigma[s] = 1.0
+                size = _heap_push(heap_keys, heap_vals, 0, 0.0, s)
+                settled = 0
+
+                # Dijkstra, counting shortest paths
+                while size > 0:
+                    d, v, size = _heap_pop(heap_keys, heap_vals, size)
+                    if done[v] or d > dist[v]:
+                        continue
+                    done[v] = True
+                    order[settled] = v
+                    settled += 1
+                    for a in range(indptr[v], indptr[v + 1]):
+                        w = indices[a]
+                        if w == v:
+                            continue
+                        alt = dist[v] + data[a]
+                        if alt < dist[w]:
+                            dist[w] = alt
+                            sigma[w] = sigma[v]
+                            size = _heap_push(heap_keys, heap_vals, size, alt, w)
+                        elif alt == dist[w]:
+                            sigma[w] += sigma[v]
+
+                # Dependency accumulation in reverse settling order
+                for i in range(settled - 1, 0, -1):
+                    w = order[i]
+                    coeff = (1.0 + delta[w]) / sigma[w]
+                    for a in range(indptr[w], indptr[w + 1]):
+                        v = indices[a]
+                        if v != w and dist[v] + data[a] == dist[w]:
+                            delta[v] += sigma[v] * coeff
+                    partial[c, w] += delta[w]
+        return partial.sum(axis=0)
+
+def betweenness_csr(A, k=None, seed=None):
+    """
+    Weighted betweenness centrality on a symmetric CSR adjacency matrix.
+    Edge weights are treated as distances; results (including the k-source
+    approximation and its rescaling) match
+    nx.betweenness_centrality(G, k=k, weight="weight", normalized=True, seed=seed).
+    The sampled estimate is unbiased; with normalized scores its variance is
+    O(1/k) independent of the graph size, so a few hundred sources suffice.
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        k (int): Number of sampled source nodes (None = exact).
+        seed (int): Random seed for the source sample.
+
+    Returns:
+        np.ndarray: Betweenness per row of A.
+    """
+    n = A.shape[0]
+    if k is not None and k >= n:
+        k = None
+    # Same sample as NetworkX: random.Random(seed).sample over the node order
+    sources = np.arange(n) if k is None else np.asarray(random.Random(seed).sample(range(n), k))
+
+    if NUMBA_AVAILABLE:
+        B = scipy.sparse.csr_array(A)
+        n_chunks = max(1, min(numba.get_num_threads(), sources.size))
+        bc = _brandes_kernel(B.indptr, B.indices, B.data.astype(np.float64), sources.astype(np.int64), n_chunks)
+    else:
+        G = nx.from_scipy_sparse_array(A, edge_attribute="weight")
+        values = nx.betweenness_centrality(G, k=k, weight="weight", normalized=True, seed=seed)
+        return np.array([values[i] for i in range(n)])
+
+    # Rescale like NetworkX (normalized, endpoints excluded)
+    if n <= 2:
+        return bc
+    if k is None:
+        return bc / ((n - 1) * (n - 2))
+    scale = np.full(n, 1.0 / (k * (n - 2)))
+    scale[sources] = 1.0 / ((k - 1) * (n - 2)) if k > 1 else np.nan
+    return bc * scale
+
+def csr_to_igraph(A, nodes_list):
+    """
+    Builds an igraph Graph from a symmetric CSR adjacency matrix.
+    Vertex i corresponds to row i of A; names are kept in vs['name'].
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        nodes_list (list): Node name for every row/column of A.
+
+    Returns:
+        igraph.Graph: Undirected graph with a 'weight' edge attribute.
+    """
+    if not IGRAPH_AVAILABLE:
+        raise ImportError("'igraph' library not installed. Run: pip install igraph")
+
+    upper = scipy.sparse.triu(A, format="coo")
+    return ig.Graph(
+        n=A.shape[0],
+        edges=np.column_stack([upper.row, upper.col]),
+        edge_attrs={"weight": upper.data},
+        vertex_attrs={"name": list(nodes_list)}
+    )
+
+def graph_to_igraph(G, weight="weight"):
+    """
+    Converts a NetworkX graph into an igraph Graph for the C-backed algorithms.
+    Vertex i corresponds to the i-th node of G; names are kept in vs['name'].
+
+    Parameters:
+        G (nx.Graph): The graph to convert.
+        weight (str): Edge attribute copied to the igraph 'weight' attribute.
+
+    Returns:
+        igraph.Graph: Undirected weighted graph.
+    """
+    nodes_list, A = graph_to_csr(G, weight=weight)
+    return csr_to_igraph(A, nodes_list)
+
+def clusters_to_labels(clusters, n):
+    """
+    Cluster ID per node from a list of member-index tuples (e.g. the output of
+    markov_clustering.get_clusters). Nodes in no cluster get -1; a node listed
+    in several clusters keeps the last one.
+
+    Parameters:
+        clusters (list): Member row indices of every cluster, in cluster ID order.
+        n (int): Number of nodes.
+
+    Returns:
+        np.ndarray: int32 cluster ID per node.
+    """
+    sizes = np.fromiter(map(len, clusters), dtype=np.int64, count=len(clusters))
+    members = np.fromiter(itertools.chain.from_iterable(clusters), dtype=np.int64, count=int(sizes.sum()))
+    labels = np.full(n, -1, dtype=np.int32)
+    labels[members] = np.repeat(np.arange(len(clusters), dtype=np.int32), sizes)
+    return labels
+
+def relabel_by_size(labels, n_clusters):
+    """
+    Renumbers clusters so that ID 0 is the largest (ties keep their old order),
+    which lets tables and summaries use the stored order without sorting again.
+
+    Parameters:
+        labels (np.ndarray): Cluster ID per node (-1 = no cluster, kept as is).
+        n_clusters (int): Total number of clusters.
+
+    Returns:
+        np.ndarray: int32 cluster ID per node, ordered by descending cluster size.
+    """
+    labels = np.asarray(labels)
+    sizes = np.bincount(labels[labels >= 0], minlength=n_clusters)
+    rank = np.empty(n_clusters + 1, dtype=np.int32)
+    rank[np.argsort(-sizes, kind="stable")] = np.arange(n_clusters, dtype=np.int32)
+    rank[-1] = -1  # label -1 indexes the last slot
+    return rank[labels]
+
+def cluster_members(names, labels, n_clusters):
+    """
+    Member names of every cluster, from one stable argsort of the labels.
+
+    Parameters:
+        names (np.ndarray): Node name per row.
+        labels (np.ndarray): Cluster ID per row, -1 for nodes in no cluster.
+        n_clusters (int): Total number of clusters.
+
+    Returns:
+        list: One set of node names per cluster ID; -1 rows belong to none.
+    """
+    if n_clusters == 0:
+        return []
+    keep = labels >= 0
+    labels = labels[keep]
+    order = np.argsort(labels, kind="stable")
+    bounds = np.searchsorted(labels[order], np.arange(1, n_clusters))
+    return [set(group.tolist()) for group in np.split(np.asarray(names)[keep][order], bounds)]
+
+def block_to_nx(block, names):
+    """
+    Builds a NetworkX graph from a square adjacency block.
+
+    Parameters:
+        block (scipy.sparse matrix): Symmetric weighted adjacency of the subgraph.
+        names (list): Node name for every row/column of the block.
+
+    Returns:
+        nx.Graph: Graph with node names and a 'weight' edge attribute.
+    """
+    H = nx.from_scipy_sparse_array(block, edge_attribute="weight")
+    return nx.relabel_nodes(H, dict(enumerate(names)), copy=False)
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _weighted_clustering_kernel(indptr, indices, data, max_weight):
+        """Per-node Onnela clustering on a CSR block with sorted column indices."""
+        n = indptr.shape[0] - 1
+        out = np.zeros(n)
+        for i in prange(n):
+            tri = 0.0
+            deg = 0
+            for a in range(indptr[i], indptr[i + 1]):
+                j = indices[a]
+                if j == i:
+                    continue
+                deg += 1
+                w_ij = data[a] / max_weight
+                # Intersect the sorted neighbour lists of i and j
+                p, q = indptr[i], indptr[j]
+                while p < indptr[i + 1] and q < indptr[j + 1]:
+                    k_i, k_j = indices[p], indices[q]
+                    if k_i < k_j:
+                        p += 1
+                    elif k_i > k_j:
+                        q += 1
+                    else:
+                        if k_i != i and k_i != j:
+                            tri += (w_ij * (data[p] / max_weight) * (data[q] / max_weight)) ** (1.0 / 3.0)
+                        p += 1
+                        q += 1
+            if deg > 1:
+                out[i] = tri / (deg * (deg - 1))
+        return out
+
+    @njit(parallel=True, cache=True)
+    def _cluster_stats_kernel(indptr, indices, data, labels, cluster_max):
+        """
+        One pass over a CSR matrix with sorted column indices. Per node: the
+        number of intra-cluster edges it owns (neighbours j >= i, so every edge
+        and self-loop is counted once) and its Onnela clustering coefficient
+        inside its own cluster (weights normalized by that cluster's maximum).
+        """
+        n = indptr.shape[0] - 1
+        own_edges = np.zeros(n, dtype=np.int64)
+        clust = np.zeros(n)
+        for i in prange(n):
+            c = labels[i]
+            tri = 0.0
+            deg = 0
+            for a in range(indptr[i], indptr[i + 1]):
+                j = indices[a]
+                if labels[j] != c:
+                    continue
+                if j >= i:
+                    own_edges[i] += 1
+                if j == i:
+                    continue
+                deg += 1
+                # Intersect the sorted neighbour lists of i and j (same cluster only)
+                p, q = indptr[i], indptr[j]
+                while p < indptr[i + 1] and q < indptr[j + 1]:
+                    k_i, k_j = indices[p], indices[q]
+                    if k_i < k_j:
+                        p += 1
+                    elif k_i > k_j:
+                        q += 1
+                    else:
+                        if k_i != i and k_i != j and labels[k_i] == c:
+                            tri += (data[a] * data[p] * data[q]) ** (1.0 / 3.0)
+                        p += 1
+                        q += 1
+            if deg > 1:
+                clust[i] = tri / (cluster_max[c] * deg * (deg - 1))
+        return own_edges, clust
+
+def _clustering_spgemm(B, max_weight):
+    """
+    Onnela clustering from sparse products: with C the cube root of the
+    normalized weights (diagonal removed), the weighted triangle sum of node i
+    is (C @ C @ C)[i, i], read off as the row sums of (C @ C) * C.
+    """
+    C = scipy.sparse.csr_array(B, dtype=np.float64, copy=True)
+    C.setdiag(0)
+    C.eliminate_zeros()
+    C.data = np.cbrt(C.data / max_weight)
+    tri = ((C @ C) * C).sum(axis=1)
+    deg = np.diff(C.indptr)
+    denom = deg * (deg - 1)
+    return np.divide(tri, denom, out=np.zeros(len(deg)), where=denom > 0)
+
+def clustering_csr(block):
+    """
+    Weighted clustering coefficient of every node of an adjacency block.
+    Same definition as nx.clustering(G, weight="weight") (geometric mean of
+    the triangle weights, normalized by the largest weight in the block).
+    Uses the Numba kernel when available, otherwise sparse matrix products.
+
+    Parameters:
+        block (scipy.sparse matrix): Symmetric weighted adjacency of the subgraph.
+
+    Returns:
+        np.ndarray: Clustering coefficient per row of the block.
+    """
+    n = block.shape[0]
+    # Fewer than 3 nodes cannot form a triangle
+    if n < 3:
+        return np.zeros(n)
+
+    B = scipy.sparse.csr_array(block)
+    max_weight = float(B.data.max()) if B.nnz else 1.0
+    if not NUMBA_AVAILABLE:
+        return _clustering_spgemm(B, max_weight)
+
+    # The kernel needs sorted rows; sort a copy, the caller's arrays may be read-only memmaps
+    if not B.has_sorted_indices:
+        B = B.sorted_indices()
+    return _weighted_clustering_kernel(B.indptr, B.indices, B.data.astype(np.float64), max_weight)
+
+def cluster_average_clustering(A, labels, n_clusters):
+    """
+    Average weighted clustering coefficient of every cluster's induced subgraph,
+    for all clusters at once. Same values as
+    nx.average_clustering(G.subgraph(cluster), weight="weight") per cluster:
+    intra-cluster edges are normalized by their own cluster's largest weight,
+    then one sparse triangle count covers the whole block-diagonal matrix.
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        labels (np.ndarray): Cluster ID per row/column of A.
+        n_clusters (int): Total number of clusters.
+
+    Returns:
+        np.ndarray: Average clustering coefficient per cluster ID.
+    """
+    coo = scipy.sparse.coo_array(A)
+    same = labels[coo.row] == labels[coo.col]
+    row, col, w = coo.row[same], coo.col[same], coo.data[same].astype(np.float64)
+
+    # Largest intra-cluster weight per cluster (Onnela normalization of each subgraph)
+    cluster_max = np.zeros(n_clusters)
+    np.maximum.at(cluster_max, labels[row], w)
+    A_in = scipy.sparse.csr_array((w / cluster_max[labels[row]], (row, col)), shape=A.shape)
+
+    node_clust = _clustering_spgemm(A_in, 1.0)
+    sizes = np.bincount(labels, minlength=n_clusters)
+    totals = np.bincount(labels, weights=node_clust, minlength=n_clusters)
+    return np.divide(totals, sizes, out=np.zeros(n_clusters), where=sizes > 0)
+
+def cluster_stats_csr(A, labels, n_clusters):
+    """
+    Size, internal edge count, density and average weighted clustering of every
+    cluster (as cluster_edge_stats + cluster_average_clustering), computed in a
+    single Numba pass over the CSR arrays when Numba is installed.
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        labels (np.ndarray): Cluster ID per row/column of A.
+        n_clusters (int): Total number of clusters.
+
+    Returns:
+        tuple: (sizes, edges, density, avg_clust) as NumPy arrays indexed by cluster ID.
+    """
+    if not NUMBA_AVAILABLE:
+        sizes, edges, density = cluster_edge_stats(A, labels, n_clusters)
+        return sizes, edges, density, cluster_average_clustering(A, labels, n_clusters)
+
+    B = scipy.sparse.csr_array(A)
+    # The kernel needs sorted rows; sort a copy, the caller's arrays may be read-only memmaps
+    if not B.has_sorted_indices:
+        B = B.sorted_indices()
+    labels = np.asarray(labels, dtype=np.int64)
+    data = B.data.astype(np.float64)
+
+    # Largest intra-cluster weight per cluster (Onnela normalization of each subgraph)
+    rows = np.repeat(np.arange(B.shape[0]), np.diff(B.indptr))
+    same = labels[rows] == labels[B.indices]
+    cluster_max = np.zeros(n_clusters)
+    np.maximum.at(cluster_max, labels[rows[same]], data[same])
+    # Clusters without internal edges have no triangles; avoid dividing by 0
+    cluster_max[cluster_max == 0] = 1.0
+
+    own_edges, clust = _cluster_stats_kernel(B.indptr, B.indices, data, labels, cluster_max)
+
+    sizes = np.bincount(labels, minlength=n_clusters)
+    edges = np.bincount(labels, weights=own_edges, minlength=n_clusters).astype(np.int64)
+    density = _density(sizes, edges)
+    avg_clust = np.divide(np.bincount(labels, weights=clust, minlength=n_clusters), sizes,
+                          out=np.zeros(n_clusters), where=sizes > 0)
+    return sizes, edges, density, avg_clust
+
+def cluster_arrays(data):
+    """
+    Returns (csr, nodes, labels) from a clustering bundle (the pickled dict) or a
+    loaded cluster artifact. Bundles written before the arrays were added are
+    converted from their graph; nodes outside every community get label -1.
+    """
+    if "adjacency" in data:
+        return data["adjacency"], np.asarray(data["nodes"]), np.asarray(data["labels"])
+    if "csr" in data:
+        return data["csr"], np.asarray(data["nodes"]), np.asarray(data["labels"])
+
+    nodes, csr = graph_to_csr(data["graph"])
+    node2cluster = {n: cid for cid, comm in enumerate(data["communities"]) for n in comm}
+    labels = np.array([node2cluster.get(n, -1) for n in nodes])
+    return csr, np.asarray(nodes), labels
+
+def modularity_terms(A, labels, n_clusters=None):
+    """
+    Per-cluster terms of the modularity: twice the intra-cluster weight (2 * L_c),
+    the cluster strength d_c and the total weight 2m. Kept alongside a stored
+    modularity, they let Q be updated when a node moves without a full pass.
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        labels (np.ndarray): Cluster ID per row/column of A.
+        n_clusters (int): Total number of clusters (defaults to labels.max() + 1).
+
+    Returns:
+        tuple: (intra, d, two_m) - 2 * L_c and d_c per cluster, and 2m.
+    """
+    if n_clusters is None:
+        n_clusters = int(labels.max()) + 1
+
+    coo = scipy.sparse.coo_array(A)
+    diag = A.diagonal()
+
+    # Node strengths (self-loops counted twice) and total weight 2m
+    strength = np.bincount(coo.row, weights=coo.data, minlength=A.shape[0]) + diag
+    two_m = float(strength.sum())
+
+    # Intra-cluster weight: off-diagonal entries appear twice in A, self-loops once,
+    # so adding the diagonal again makes every edge count twice (= 2 * L_c)
+    same = labels[coo.row] == labels[coo.col]
+    intra = np.bincount(labels[coo.row[same]], weights=coo.data[same], minlength=n_clusters)
+    intra += np.bincount(labels, weights=diag, minlength=n_clusters)
+
+    d = np.bincount(labels, weights=strength, minlength=n_clusters)
+    return intra, d, two_m
+
+def modularity_csr(A, labels, n_clusters=None, resolution=1.0):
+    """
+    Computes Newman modularity with the closed form
+    Q = sum_c [ L_c/m - resolution * (d_c/2m)^2 ] in one pass over the CSR nonzeros.
+    Same definition as networkx's modularity (self-loops count twice in the degree).
+
+    Parameters:
+        A (scipy.sparse matrix): Symmetric weighted adjacency matrix.
+        labels (np.ndarray): Cluster ID per row/column of A.
+        n_clusters (int): Total number of clusters (defaults to labels.max() + 1).
+        resolution (float): Resolution parameter (gamma).
+
+    Returns:
+        float: The modularity score.
+    """
+    intra, d, two_m = modularity_terms(A, labels, n_clusters)
+    return float(np.sum(intra / two_m - resolution * (d / two_m) ** 2))
+
+def igraph_betweenness(G, weight="weight"):
+    """
+    Weighted betweenness centrality through igraph's C implementation.
+    Edge weights are treated as distances and the result is normalized
+    exactly like nx.betweenness_centrality(G, weight=weight, normalized=True).
+
+    Parameters:
+        G (nx.Graph): Undirected graph.
+        weight (str): Edge attribute used as the edge length.
+
+    Returns:
+        dict: {node: betweenness}
+    """
+    g_ig = graph_to_igraph(G, weight=weight)
+    n = g_ig.vcount()
+    # igraph counts each unordered pair once; NetworkX's normalization is 2 / ((n-1)(n-2))
+    scale = 2.0 / ((n - 1) * (n - 2)) if n > 2 else 0.0
+    values = np.asarray(g_ig.betweenness(weights="weight")) * scale
+    return dict(zip(g_ig.vs["name"], values.tolist()))
@@ -0,0 +1,70 @@
+"""
+Module: layout_cache.py
+Description:
+    On-disk memoization of NetworkX node layouts.
+    Force-directed layouts are usually the slowest step of drawing a cluster,
+    and re-running a script for another protein in the same cluster would
+    recompute the exact same positions. Layouts are stored as small .npz files
+    keyed by a hash of the graph (nodes, edges and weights), the algorithm, the seed
+    and any extra layout arguments.
+"""
+
+import hashlib
+import os
+import numpy as np
+import networkx as nx
+
+LAYOUTS = {
+    "spring": lambda G, seed, **kwargs: nx.spring_layout(G, seed=seed, **kwargs),
+    "kamada_kawai": lambda G, seed, **kwargs: nx.kamada_kawai_layout(G, **kwargs),
+    # Eigenvectors of the Laplacian via SciPy's ARPACK - fast first layout for large clusters
+    "spectral": lambda G, seed, **kwargs: nx.spectral_layout(G, **kwargs),
+}
+
+def layout_key(G, method="spring", seed=42, **layout_kwargs):
+    """
+    Builds a stable hash for a graph layout request.
+
+    Parameters:
+        G (nx.Graph): The graph to lay out.
+        method (str): Layout algorithm name (key of LAYOUTS).
+        seed (int): Random seed passed to the layout.
+        **layout_kwargs: Extra arguments of the layout function (e.g. k for spring).
+
+    Returns:
+        str: Hex digest identifying the layout.
+    """
+    h = hashlib.sha1(f"{method}|{seed}|{sorted(layout_kwargs.items())}|".encode())
+    h.update(",".join(sorted(map(str, G))).encode())
+    edges = sorted(f"{min(str(u), str(v))}-{max(str(u), str(v))}:{w}" for u, v, w in G.edges(data="weight"))
+    h.update(";".join(edges).encode())
+    return h.hexdigest()
+
+def cached_layout(G, cache_dir, prefix="layout", method="spring", seed=42, **layout_kwargs):
+    """
+    Returns node positions for G, loading them from cache_dir when available.
+
+    Parameters:
+        G (nx.Graph): The graph to lay out.
+        cache_dir (str): Directory holding the cached .npz layouts.
+        prefix (str): File name prefix (e.g. the cluster ID).
+        method (str): "spring", "kamada_kawai" or "spectral".
+        seed (int): Random seed for the layout.
+        **layout_kwargs: Extra arguments passed to the layout function.
+
+    Returns:
+        dict: {node: np.ndarray([x, y])}
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{prefix}_{layout_key(G, method, seed, **layout_kwargs)}.npz")
+
+    if os.path.exists(path):
+        with np.load(path, allow_pickle=False) as f:
+            # Cached node names are strings; map them back onto G's node objects
+            by_name = {str(n): n for n in G.nodes()}
+            return {by_name[name]: xy for name, xy in zip(f["nodes"].tolist(), f["pos"])}
+
+    pos = LAYOUTS[method](G, seed, **layout_kwargs)
+    nodes = list(pos)
+    np.savez(path, nodes=np.asarray([str(n) for n in nodes]), pos=np.asarray([pos[n] for n in nodes]))
+    return pos
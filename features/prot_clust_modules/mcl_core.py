@@ -0,0 +1,363 @@
+"""
+Module: mcl_core.py
+Description:
+    Vectorized Markov Clustering (MCL) loop.
+    Same algorithm and parameters as markov_clustering.run_mcl (self-loops,
+    column normalization, expansion, inflation, pruning, convergence check),
+    but every step works on the sparse matrix arrays directly instead of
+    Python-level loops and DOK matrices.
+    Runs on the GPU through CuPy when it is installed and a device is present;
+    on the CPU the inflation/pruning pass is a Numba kernel when Numba is installed,
+    and the expansion uses Intel MKL's multi-threaded sparse product when
+    sparse_dot_mkl is installed. With python-graphblas installed (optional,
+    pip install python-graphblas) the whole CPU loop can run in
+    SuiteSparse:GraphBLAS instead; it is opt-in through run_mcl(use_graphblas=True).
+    Also holds the shared MCL pipeline (edge list -> matrix -> clusters) used by
+    both MCL scripts, cached on disk per input file and parameter set.
+"""
+
+import hashlib
+import os
+import numpy as np
+import scipy.sparse
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+import markov_clustering as mc
+from graph_metrics import csv_to_csr, clusters_to_labels, modularity_csr
+
+# Try importing CuPy for the GPU code path
+try:
+    import cupy as cp
+    import cupyx.scipy.sparse as cpsp
+    CUPY_AVAILABLE = True
+except ImportError:
+    CUPY_AVAILABLE = False
+
+# Numba fuses inflation, normalization and pruning into one pass on the CPU
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# sparse_dot_mkl runs the expansion's sparse products multi-threaded in Intel MKL
+try:
+    from sparse_dot_mkl import dot_product_mkl
+    MKL_AVAILABLE = True
+except ImportError:
+    MKL_AVAILABLE = False
+
+# SuiteSparse:GraphBLAS can run the whole loop (expansion, inflation, pruning) in parallel C.
+# Optional (pip install python-graphblas) and only used when run_mcl is asked to
+try:
+    import graphblas as gb
+    GRAPHBLAS_AVAILABLE = True
+except ImportError:
+    GRAPHBLAS_AVAILABLE = False
+
+# Rows per chunk when streaming the edge-list CSV
+CSV_CHUNKSIZE = 500_000
+
+def gpu_available():
+    """Returns True if CuPy is installed and can see at least one CUDA device."""
+    if not CUPY_AVAILABLE:
+        return False
+    try:
+        return cp.cuda.runtime.getDeviceCount() > 0
+    except Exception:
+        return False
+
+def _normalize(M, xp):
+    """Scales every column of the CSC matrix M to sum to 1 (in place)."""
+    col_sums = xp.asarray(M.sum(axis=0)).ravel()
+    M.data /= xp.repeat(col_sums, xp.diff(M.indptr))
+    return M
+
+def _expand(M, power, use_mkl=False):
+    """Expansion: raises M to the given matrix power with sparse products."""
+    result = M
+    for _ in range(power - 1):
+        result = dot_product_mkl(result, M) if use_mkl else result @ M
+    return result
+
+def _inflate(M, power, xp):
+    """Inflation: element-wise power followed by column normalization."""
+    M.data **= power
+    return _normalize(M, xp)
+
+def _prune(M, threshold, xp):
+    """
+    Removes entries below the threshold (in place).
+    The maximum value of each column is always kept.
+    """
+    col_max = M.max(axis=0).toarray().ravel()
+    entry_col_max = xp.repeat(col_max, xp.diff(M.indptr))
+    keep = (M.data >= threshold) | (M.data == entry_col_max)
+    M.data *= keep
+    M.eliminate_zeros()
+    return M
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, cache=True)
+    def _normalize_kernel(indptr, data):
+        """Scales every column of a CSC matrix (given by its arrays) to sum to 1."""
+        for j in prange(indptr.size - 1):
+            total = 0.0
+            for a in range(indptr[j], indptr[j + 1]):
+                total += data[a]
+            if total > 0:
+                for a in range(indptr[j], indptr[j + 1]):
+                    data[a] /= total
+
+    @njit(parallel=True, cache=True)
+    def _inflate_prune_kernel(indptr, data, power, threshold):
+        """
+        Per column: element-wise power, normalization and pruning in one pass.
+        Entries below the threshold are set to 0, except the column maximum.
+        """
+        for j in prange(indptr.size - 1):
+            start, end = indptr[j], indptr[j + 1]
+            total = 0.0
+            for a in range(start, end):
+                data[a] = data[a] ** power
+                total += data[a]
+            if total == 0:
+                continue
+            col_max = 0.0
+            for a in range(start, end):
+                data[a] /= total
+                if data[a] > col_max:
+                    col_max = data[a]
+            if threshold > 0:
+                for a in range(start, end):
+                    if data[a] < threshold and data[a] != col_max:
+                        data[a] = 0.0
+
+def _inflate_prune_numba(M, power, threshold):
+    """Numba version of _inflate followed by _prune (in place)."""
+    _inflate_prune_kernel(M.indptr, M.data, power, threshold)
+    M.eliminate_zeros()
+    return M
+
+def _converged(M, last, rtol=1e-5, atol=1e-8):
+    """Sparse version of np.allclose(M, last)."""
+    c = abs(M - last) - rtol * abs(last)
+    return bool(c.max() <= atol)
+
+def _scale_columns_gb(A, factors):
+    """GraphBLAS: multiplies column j of A by factors[j] (A @ diag(factors))."""
+    return A.mxm(factors.diag(), gb.semiring.plus_times).new()
+
+def _run_mcl_graphblas(M, expansion, inflation, iterations, pruning_threshold, rtol=1e-5, atol=1e-8):
+    """
+    The MCL loop of run_mcl on a graphblas.Matrix.
+    M is the scipy matrix with self-loops already set; returns a scipy csc_matrix.
+    """
+    A = gb.io.from_scipy_sparse(M)
+    # Column normalization: scale by the reciprocal column sums
+    A = _scale_columns_gb(A, A.reduce_columnwise(gb.monoid.plus).new().apply(gb.unary.minv).new())
+
+    for _ in range(iterations):
+        last = A
+        # Expansion
+        R = A
+        for _ in range(expansion - 1):
+            R = R.mxm(A, gb.semiring.plus_times).new()
+        # Inflation: element-wise power (typed op keeps the matrix dtype), then column normalization
+        R = R.apply(gb.binary.pow[R.dtype], right=inflation).new()
+        A = _scale_columns_gb(R, R.reduce_columnwise(gb.monoid.plus).new().apply(gb.unary.minv).new())
+        # Pruning: keep entries >= threshold, and always the column maximum
+        # (entry >= min(threshold, column max))
+        if pruning_threshold > 0:
+            col_min_keep = A.reduce_columnwise(gb.monoid.max).new().apply(gb.binary.min[A.dtype], right=pruning_threshold).new()
+            keep = A.ewise_mult(_scale_columns_gb(A.apply(gb.unary.one).new(), col_min_keep), gb.binary.ge).new()
+            A = A.dup(mask=keep.V)
+        # Convergence: np.allclose(A, last) over the union of both patterns
+        diff = A.ewise_add(last, gb.binary.minus).new().apply(gb.unary.abs).new()
+        c = diff.ewise_add(last.apply(gb.unary.abs).new().apply(gb.binary.times, right=rtol).new(), gb.binary.minus).new()
+        c_max = c.reduce_scalar(gb.monoid.max).new().value
+        if c_max is None or c_max <= atol:
+            break
+
+    return scipy.sparse.csc_matrix(gb.io.to_scipy_sparse(A, format="csc"))
+
+def run_mcl(matrix, expansion=2, inflation=2, loop_value=1, iterations=100,
+            pruning_threshold=0.001, use_gpu=None, dtype=np.float64, use_graphblas=False):
+    """
+    Runs MCL on a symmetric similarity matrix.
+
+    Parameters:
+        matrix (scipy.sparse matrix): Weighted adjacency matrix.
+        expansion (int): Cluster expansion factor (matrix power).
+        inflation (float): Cluster inflation factor (element-wise power).
+        loop_value (float): Value put on the diagonal before the first iteration.
+        iterations (int): Maximum number of iterations.
+        pruning_threshold (float): Entries below this are dropped after each iteration.
+        use_gpu (bool): Force the CuPy path on/off. None = use the GPU if available.
+        dtype (np.dtype): Value type of the working matrix. np.float32 halves the
+                          memory traffic of the sparse products.
+        use_graphblas (bool): Run the CPU loop in SuiteSparse:GraphBLAS instead of the
+                              Numba/MKL kernels (requires python-graphblas).
+
+    Returns:
+        scipy.sparse.csc_matrix: The converged matrix (pass to markov_clustering.get_clusters).
+    """
+    if use_gpu is None:
+        use_gpu = gpu_available()
+    xp = cp if use_gpu else np
+
+    # Initialize self-loops (replace the diagonal by loop_value)
+    n = matrix.shape[0]
+    M = scipy.sparse.csc_matrix(matrix, dtype=dtype)
+    M = M - scipy.sparse.diags(M.diagonal()) + scipy.sparse.identity(n, dtype=dtype, format="csc") * dtype(loop_value)
+    M = scipy.sparse.csc_matrix(M, dtype=dtype)
+    M.eliminate_zeros()
+
+    if use_graphblas and not use_gpu:
+        if not GRAPHBLAS_AVAILABLE:
+            raise ImportError("'python-graphblas' library not installed. Run: pip install python-graphblas")
+        return _run_mcl_graphblas(M, expansion, inflation, iterations, pruning_threshold)
+
+    if use_gpu:
+        M = cpsp.csc_matrix(M)
+    use_numba = NUMBA_AVAILABLE and not use_gpu
+    use_mkl = MKL_AVAILABLE and not use_gpu
+
+    if use_numba:
+        _normalize_kernel(M.indptr, M.data)
+    else:
+        M = _normalize(M, xp)
+
+    for _ in range(iterations):
+        last = M
+        M = _expand(M, expansion, use_mkl)
+        if use_numba:
+            M = _inflate_prune_numba(scipy.sparse.csc_matrix(M), inflation, pruning_threshold)
+        else:
+            M = _inflate(M, inflation, xp)
+            if pruning_threshold > 0:
+                M = _prune(M, pruning_threshold, xp)
+        if _converged(M, last):
+            break
+
+    if use_gpu:
+        M = M.get()
+    return M
+
+def load_mcl_matrix(csv_path, pruning_threshold=0.001):
+    """
+    Reads a STRING edge list and builds the MCL input matrix.
+    Scores are normalized to 0-1 (combined_score / 1000), stored as float32,
+    entries below the pruning threshold are dropped and the rows are put in
+    Reverse Cuthill-McKee order.
+
+    Parameters:
+        csv_path (str): Edge list with protein1, protein2 and combined_score columns.
+        pruning_threshold (float): Normalized weights below this are dropped.
+
+    Returns:
+        tuple: (scipy.sparse.csr_matrix, list of node names in row order)
+    """
+    # Streamed in chunks straight into the COO buffers, the full edge DataFrame is never built.
+    # MCL works best with weights between 0.0 and 1.0 ('combined_score' is 0-1000);
+    # the scaling happens while each chunk is copied into the float32 buffer
+    nodes, matrix = csv_to_csr(csv_path, 'protein1', 'protein2', 'combined_score', chunksize=CSV_CHUNKSIZE, scale=1 / 1000)
+
+    # Weights are float32 (half the memory traffic of MCL's sparse products);
+    # entries below the pruning threshold are dropped before the first expansion
+    matrix.data[matrix.data < pruning_threshold] = 0
+    matrix.eliminate_zeros()
+
+    # Reverse Cuthill-McKee: renumber nodes so neighbours get nearby row indices,
+    # which keeps the working set of MCL's sparse products cache-resident
+    perm = reverse_cuthill_mckee(matrix, symmetric_mode=True)
+    # Column indexing leaves the rows unsorted; store them sorted for the CSR kernels
+    matrix = matrix[perm][:, perm]
+    matrix.sort_indices()
+    return matrix, nodes[perm].tolist()
+
+def compute_mcl(csv_path, inflation=2.0, expansion=2, pruning_threshold=0.001, use_graphblas=False):
+    """
+    Full MCL pipeline: edge list -> matrix -> MCL -> clusters.
+
+    Parameters:
+        csv_path (str): Edge list with protein1, protein2 and combined_score columns.
+        inflation (float): Cluster inflation factor.
+        expansion (int): Cluster expansion factor.
+        pruning_threshold (float): Pruning threshold for the input and every iteration.
+        use_graphblas (bool): Run the MCL loop in SuiteSparse:GraphBLAS (see run_mcl).
+
+    Returns:
+        tuple: (matrix, nodes_list, clusters, modularity) - the MCL input matrix, the
+               node name per row, the clusters as tuples of row indices (largest
+               first) and the modularity of the clustering on the matrix.
+    """
+    matrix, nodes_list = load_mcl_matrix(csv_path, pruning_threshold)
+    result = run_mcl(
+        matrix,
+        inflation=inflation,
+        expansion=expansion,
+        pruning_threshold=pruning_threshold,
+        dtype=np.float32,
+        use_graphblas=use_graphblas
+    )
+    clusters = mc.get_clusters(result)
+    clusters.sort(key=len, reverse=True)
+
+    # Modularity is computed once here and cached with the clusters
+    modularity = modularity_csr(matrix, clusters_to_labels(clusters, len(nodes_list)), len(clusters))
+    return matrix, nodes_list, clusters, modularity
+
+def _cache_key(csv_path, **params):
+    """sha256 over the input file identity (path, mtime, size) and the MCL parameters."""
+    st = os.stat(csv_path)
+    ident = f"{os.path.abspath(csv_path)}|{st.st_mtime_ns}|{st.st_size}|{sorted(params.items())}"
+    return hashlib.sha256(ident.encode()).hexdigest()
+
+def get_or_compute(csv_path, cache_dir="data/output/mcl_cache", inflation=2.0, expansion=2, pruning_threshold=0.001,
+                   use_graphblas=False):
+    """
+    Returns the result of compute_mcl, loading it from cache_dir when the same
+    input file was already clustered with the same parameters.
+
+    Parameters:
+        csv_path (str): Edge list with protein1, protein2 and combined_score columns.
+        cache_dir (str): Directory for the cached results (mcl_<sha256>.npz).
+        inflation (float): Cluster inflation factor.
+        expansion (int): Cluster expansion factor.
+        pruning_threshold (float): Pruning threshold.
+        use_graphblas (bool): Run the MCL loop in SuiteSparse:GraphBLAS on a cache miss.
+            Not part of the cache key: both engines produce the same clusters.
+
+    Returns:
+        tuple: (matrix, nodes_list, clusters, modularity) as returned by compute_mcl.
+    """
+    key = _cache_key(csv_path, inflation=inflation, expansion=expansion, pruning_threshold=pruning_threshold)
+    path = os.path.join(cache_dir, f"mcl_{key}.npz")
+
+    if os.path.exists(path):
+        print(f"[INFO] Using cached MCL result: {path}")
+        with np.load(path, allow_pickle=False) as f:
+            matrix = scipy.sparse.csr_matrix((f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"]))
+            # Caches written before the rows were stored sorted
+            matrix.sort_indices()
+            members = f["members"]
+            clusters = [tuple(c.tolist()) for c in np.split(members, f["offsets"][1:-1])]
+            return matrix, f["nodes"].tolist(), clusters, float(f["modularity"])
+
+    matrix, nodes_list, clusters, modularity = compute_mcl(csv_path, inflation, expansion, pruning_threshold, use_graphblas)
+
+    # Ragged cluster list stored flat: members + start offsets
+    os.makedirs(cache_dir, exist_ok=True)
+    sizes = np.array([len(c) for c in clusters], dtype=np.int64)
+    np.savez_compressed(
+        path,
+        data=matrix.data,
+        indices=matrix.indices,
+        indptr=matrix.indptr,
+        shape=np.asarray(matrix.shape),
+        nodes=np.asarray(nodes_list, dtype=str),
+        members=np.concatenate([np.asarray(c, dtype=np.int64) for c in clusters]) if clusters else np.empty(0, dtype=np.int64),
+        offsets=np.concatenate([[0], np.cumsum(sizes)]),
+        modularity=np.float64(modularity)
+    )
+    return matrix, nodes_list, clusters, modularity
@@ -0,0 +1,19 @@
+"""
+Module: notebook_utils.py
+Description: 
+    Detects whether the code runs inside a Jupyter kernel, so the overview and
+    enrichment modules can choose between rich HTML tables and plain text.
+    Standard library only, so importing it never pulls in a heavy dependency.
+"""
+
+import sys
+
+def in_notebook():
+    """
+    True when running inside a Jupyter kernel (rich HTML tables), False for
+    scripts (plain text). A notebook has IPython loaded already, so a CLI run
+    never has to import it for this check.
+    """
+    ipython = sys.modules.get("IPython")
+    shell = ipython.get_ipython() if ipython else None
+    return shell is not None and "IPKernelApp" in shell.config
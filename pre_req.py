@@ -2,7 +2,10 @@ import ast
 import sys
 import subprocess
 import importlib.util
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
 
 # ==============================================================================
 # 1. CONFIGURATION SECTION
@@ -33,22 +36,83 @@ CUSTOM_PACKAGE_MAPPING = {
     "dateutil": "python-dateutil" # 'import dateutil' requires 'pip install python-dateutil'
 }
 
+# IMPORT CACHE:
+# The imports found in each file are remembered here, keyed by path, modification
+# time and size. Unchanged files are not parsed again on the next run.
+IMPORT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "prot_clust", "imports.json")
+
+# Standard library and built-in module names (Python 3.10+ ships the full list),
+# and the local .py files in the working directory, looked up once instead of per import
+_STDLIB = frozenset(getattr(sys, "stdlib_module_names", ())) | frozenset(sys.builtin_module_names)
+_LOCAL_FILES = frozenset(p.stem for p in Path('.').glob('*.py'))
+
 # ==============================================================================
 # 2. HELPER FUNCTIONS (The Logic)
 # ==============================================================================
 
-def get_imports_from_file(filepath):
+class _ImportCollector(ast.NodeVisitor):
+    """
+    Collects the top-level package name of every import statement in a tree.
+    Only the two import node types are handled; everything else falls through
+    to the default traversal.
+    """
+    def __init__(self):
+        self.imports = set()
+
+    # Case 1: standard imports (e.g., "import os", "import pandas as pd")
+    def visit_Import(self, node):
+        for alias in node.names:
+            # split('.')[0] ensures we get 'matplotlib' from 'matplotlib.pyplot'
+            self.imports.add(alias.name.split('.')[0])
+
+    # Case 2: from imports (e.g., "from math import sqrt")
+    def visit_ImportFrom(self, node):
+        if node.module:
+            self.imports.add(node.module.split('.')[0])
+
+def load_import_cache():
+    """
+    Loads the cached import lists from IMPORT_CACHE_PATH (empty if missing or unreadable).
+    """
+    try:
+        with open(IMPORT_CACHE_PATH, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+def save_import_cache(cache):
+    """
+    Writes the import lists back to IMPORT_CACHE_PATH. A failed write only costs
+    a re-parse on the next run, so errors are ignored.
+    """
+    try:
+        os.makedirs(os.path.dirname(IMPORT_CACHE_PATH), exist_ok=True)
+        with open(IMPORT_CACHE_PATH, "w", encoding="utf-8") as file:
+            json.dump(cache, file)
+    except OSError:
+        pass
+
+def get_imports_from_file(filepath, cache=None):
     """
     Reads a Python file and uses the 'ast' (Abstract Syntax Tree) module
     to find every library that is imported.
     
     Why 'ast'? Because parsing text with Regex is unreliable (e.g., imports 
     inside comments would be detected wrongly). AST understands the code structure.
+
+    If a cache dictionary is given, the result is looked up there first (keyed by
+    absolute path, modification time and size) and stored there after parsing.
     """
-    if not os.path.exists(filepath):
+    try:
+        stat = os.stat(filepath)
+    except FileNotFoundError:
         print(f"Warning: The file '{filepath}' was not found. Skipping.")
         return set()
 
+    key = f"{os.path.abspath(filepath)}:{stat.st_mtime_ns}:{stat.st_size}"
+    if cache is not None and key in cache:
+        return set(cache[key])
+
     # Open the file and read its content
     with open(filepath, "r", encoding="utf-8") as file:
         try:
@@ -58,36 +122,19 @@ def get_imports_from_file(filepath):
             print(f"Syntax Error in {filepath}: {e}")
             return set()
 
-    imports = set()
-    
-    # Walk through every 'node' (line/instruction) in the code tree
-    for node in ast.walk(tree):
-        
-        # Case 1: standard imports (e.g., "import os", "import pandas as pd")
-        if isinstance(node, ast.Import):
-            for alias in node.names:
-                # split('.')[0] ensures we get 'matplotlib' from 'matplotlib.pyplot'
-                imports.add(alias.name.split('.')[0]) 
-        
-        # Case 2: from imports (e.g., "from math import sqrt")
-        elif isinstance(node, ast.ImportFrom):
-            if node.module:
-                imports.add(node.module.split('.')[0])
+    collector = _ImportCollector()
+    collector.visit(tree)
 
-    return imports
+    if cache is not None:
+        cache[key] = sorted(collector.imports)
+    return collector.imports
 
 def is_standard_library(module_name):
     """
     Checks if the module is built into Python (like 'os', 'sys', 'math').
     We should NOT try to pip install these.
     """
-    # Python 3.10+ has a list of standard libraries we can check
-    if sys.version_info >= (3, 10):
-        if module_name in sys.stdlib_module_names:
-            return True
-    
-    # Fallback check for built-in modules
-    return module_name in sys.builtin_module_names
+    return module_name in _STDLIB
 
 def is_installed(module_name):
     """
@@ -100,18 +147,23 @@ def is_installed(module_name):
     except (ModuleNotFoundError, ValueError):
         return False
 
-def install_package(package_name):
+def install_packages(package_names):
     """
-    Runs the pip command to install the missing package.
-    We use sys.executable to ensure we install it for the CURRENT Python version running this script.
+    Runs ONE pip command that installs all missing packages together, so pip's
+    startup and dependency resolution are paid once instead of once per package.
+    We use sys.executable to ensure we install them for the CURRENT Python version running this script.
     """
-    print(f"   -> Installing package: {package_name}...")
+    print(f"   -> Installing packages: {', '.join(package_names)}...")
     try:
-        # Equivalent to running: python -m pip install package_name
-        subprocess.check_call([sys.executable, "-m", "pip", "install", package_name])
-        print(f"   -> Successfully installed {package_name}")
+        # Equivalent to running: python -m pip install package1 package2 ...
+        subprocess.check_call([
+            sys.executable, "-m", "pip", "install",
+            "--no-input", "--disable-pip-version-check",
+            *package_names
+        ])
+        print(f"   -> Successfully installed {', '.join(package_names)}")
     except subprocess.CalledProcessError:
-        print(f"   -> ERROR: Failed to install {package_name}. Check your internet or permissions.")
+        print(f"   -> ERROR: Failed to install {', '.join(package_names)}. Check your internet or permissions.")
 
 # ==============================================================================
 # 3. MAIN EXECUTION
@@ -121,17 +173,31 @@ def main():
     print("--- Starting Prerequisite Check ---")
     
     all_imports = set()
+    import_cache = load_import_cache()
 
     # STEP 1: Collect all imports from all files listed at the top
+    # (files are read and parsed in parallel; each one writes its own cache key).
+    # Missing files are reported here so the warnings don't interleave across threads.
+    scripts = []
     for script in FILES_TO_CHECK:
-        print(f"Scanning file: {script}")
-        found = get_imports_from_file(script)
-        all_imports.update(found)
+        if os.path.isfile(script):
+            scripts.append(script)
+        else:
+            print(f"Warning: The file '{script}' was not found. Skipping.")
+    print(f"Scanning {len(scripts)} files...")
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(scripts)))) as executor:
+        futures = {executor.submit(get_imports_from_file, script, import_cache): script for script in scripts}
+        for future in as_completed(futures):
+            print(f"Scanned file: {futures[future]}")
+            all_imports |= future.result()
+
+    save_import_cache(import_cache)
 
     print(f"\nAll imports detected: {', '.join(sorted(all_imports))}")
     print("-" * 40)
 
-    # STEP 2: Process each import
+    # STEP 2: Process each import, collecting the missing packages
+    missing = []
     for module in sorted(all_imports):
         
         # Skip Standard Library modules (os, sys, json, etc.)
@@ -139,7 +205,7 @@ def main():
             continue
 
         # Skip Local Files (e.g., if you import 'my_helper' and 'my_helper.py' exists locally)
-        if os.path.exists(f"{module}.py"):
+        if module in _LOCAL_FILES:
             print(f"✔ '{module}' is a local file.")
             continue
 
@@ -147,12 +213,17 @@ def main():
         # Use the mapping at the top if it exists, otherwise assume package name = import name.
         package_to_install = CUSTOM_PACKAGE_MAPPING.get(module, module)
 
-        # STEP 3: Check if installed, if not, install it
+        # Check if installed, if not, queue it for installation
         if is_installed(module):
             print(f"✔ '{module}' is satisfied.")
         else:
-            print(f"✘ '{module}' is MISSING. Starting installation...")
-            install_package(package_to_install)
+            print(f"✘ '{module}' is MISSING.")
+            missing.append(package_to_install)
+
+    # STEP 3: Install everything that is missing in a single pip call
+    if missing:
+        print("-" * 40)
+        install_packages(missing)
 
     print("-" * 40)
     print("Done. You can now run your scripts.")